@@ -0,0 +1,72 @@
+class Serializer:
+    """Превращает объект в словарь для JSON.
+
+    fields — словарь «имя поля: функция от объекта». Клиент может
+    запросить подмножество полей, неизвестное имя — ошибка ValueError.
+    """
+
+    fields = {}
+
+    def __init__(self, only=None):
+        if only is None:
+            self.selected = list(self.fields)
+            return
+        unknown = set(only) - set(self.fields)
+        if unknown:
+            raise ValueError(', '.join(sorted(unknown)))
+        self.selected = [name for name in self.fields if name in only]
+
+    def to_dict(self, obj):
+        return {name: self.fields[name](obj) for name in self.selected}
+
+    def to_list(self, objects):
+        return [self.to_dict(obj) for obj in objects]
+
+
+def image_url(post):
+    return post.image.url if post.image else None
+
+
+class PostSerializer(Serializer):
+    # только колонки из FEED_FIELDS: лента читается через feed_queryset
+    fields = {
+        'id': lambda post: post.id,
+        'text': lambda post: post.text,
+        'pub_date': lambda post: post.pub_date.isoformat(),
+        'author': lambda post: post.author.username,
+        'author_name': lambda post: post.author.get_full_name(),
+        'group': lambda post: post.group.slug if post.group else None,
+        'group_title': lambda post: post.group.title if post.group else None,
+        'image': image_url,
+    }
+
+
+class CommentSerializer(Serializer):
+    fields = {
+        'id': lambda comment: comment.id,
+        'author': lambda comment: comment.author.username,
+        'text': lambda comment: comment.text,
+        'created': lambda comment: comment.created.isoformat(),
+    }
+
+
+class GroupSerializer(Serializer):
+    fields = {
+        'slug': lambda group: group.slug,
+        'title': lambda group: group.title,
+        'description': lambda group: group.description,
+    }
+
+
+class AuthorSerializer(Serializer):
+    # счётчики берутся из AuthorStats, строки может ещё не быть
+    fields = {
+        'username': lambda user: user.username,
+        'full_name': lambda user: user.get_full_name(),
+        'posts_count': lambda user: getattr(
+            getattr(user, 'stats', None), 'posts_count', 0),
+        'followers_count': lambda user: getattr(
+            getattr(user, 'stats', None), 'followers_count', 0),
+        'following_count': lambda user: getattr(
+            getattr(user, 'stats', None), 'following_count', 0),
+    }
@@ -0,0 +1,139 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+from yatube.settings import COMMENTS_SHOW, POSTS_SHOW
+
+User = get_user_model()
+
+
+class ApiViewsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author',
+                                               first_name='Лев',
+                                               last_name='Толстой')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(title='Группа', slug='group',
+                                          description='Описание')
+        self.post = Post.objects.create(text='Тестовый текст',
+                                        author=self.author, group=self.group)
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_post_list(self):
+        '''Список постов в JSON'''
+        response = self.guest_client.get(reverse('api:post_list'))
+        self.assertEqual(response.status_code, 200)
+        post = response.json()['results'][0]
+        self.assertEqual(post['id'], self.post.id)
+        self.assertEqual(post['author'], 'author')
+        self.assertEqual(post['author_name'], 'Лев Толстой')
+        self.assertEqual(post['group'], 'group')
+        self.assertIsNone(post['image'])
+
+    def test_field_selection(self):
+        '''Параметр fields оставляет только нужные поля'''
+        response = self.guest_client.get(
+            reverse('api:post_list'), {'fields': 'id,text'})
+        self.assertEqual(response.json()['results'][0],
+                         {'id': self.post.id, 'text': 'Тестовый текст'})
+        response = self.guest_client.get(
+            reverse('api:post_list'), {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_pagination(self):
+        '''Курсоры ведут по страницам без повторов'''
+        Post.objects.bulk_create(
+            [Post(text=f'Пост {i}', author=self.author)
+             for i in range(POSTS_SHOW)])
+        first = self.guest_client.get(reverse('api:post_list')).json()
+        self.assertEqual(len(first['results']), POSTS_SHOW)
+        self.assertIsNone(first['previous_cursor'])
+        second = self.guest_client.get(
+            reverse('api:post_list'),
+            {'cursor': first['next_cursor']}).json()
+        self.assertEqual(len(second['results']), 1)
+        self.assertIsNone(second['next_cursor'])
+        ids = {post['id'] for post in first['results'] + second['results']}
+        self.assertEqual(len(ids), POSTS_SHOW + 1)
+
+    def test_group_and_profile_feeds(self):
+        '''Ленты группы и профиля с описанием владельца'''
+        response = self.guest_client.get(
+            reverse('api:group_feed', kwargs={'slug': 'group'}))
+        self.assertEqual(response.json()['group']['title'], 'Группа')
+        self.assertEqual(len(response.json()['results']), 1)
+        response = self.guest_client.get(
+            reverse('api:profile_feed', kwargs={'username': 'author'}))
+        self.assertEqual(response.json()['author']['posts_count'], 1)
+        response = self.guest_client.get(
+            reverse('api:group_feed', kwargs={'slug': 'missing'}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_follow_feed(self):
+        '''Лента подписок только для авторизованных'''
+        url = reverse('api:follow_feed')
+        self.assertEqual(self.guest_client.get(url).status_code, 401)
+        self.assertEqual(self.reader_client.get(url).json()['results'], [])
+        Follow.objects.create(user=self.reader, author=self.author)
+        results = self.reader_client.get(url).json()['results']
+        self.assertEqual([post['id'] for post in results], [self.post.id])
+
+    def test_post_detail_with_comments(self):
+        '''Пост отдаётся вместе с комментариями'''
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Комментарий')
+        response = self.guest_client.get(
+            reverse('api:post_detail', kwargs={'post_id': self.post.id}))
+        data = response.json()
+        self.assertEqual(data['text'], 'Тестовый текст')
+        self.assertEqual(data['comments'][0]['author'], 'reader')
+        self.assertIsNone(data['next_cursor'])
+
+    def test_post_detail_comments_paginated(self):
+        '''Комментарии отдаются порциями по курсору'''
+        for number in range(COMMENTS_SHOW + 1):
+            Comment.objects.create(post=self.post, author=self.reader,
+                                   text=f'Комментарий {number}')
+        url = reverse('api:post_detail', kwargs={'post_id': self.post.id})
+        data = self.guest_client.get(url).json()
+        self.assertEqual(len(data['comments']), COMMENTS_SHOW)
+        self.assertEqual(data['comments'][0]['text'], 'Комментарий 0')
+        data = self.guest_client.get(
+            url, {'cursor': data['next_cursor']}).json()
+        self.assertEqual([comment['text'] for comment in data['comments']],
+                         [f'Комментарий {COMMENTS_SHOW}'])
+        self.assertEqual(data['text'], 'Тестовый текст')
+        self.assertIsNone(data['next_cursor'])
+
+    def test_read_only(self):
+        '''API принимает только GET и HEAD'''
+        response = self.reader_client.post(reverse('api:post_list'))
+        self.assertEqual(response.status_code, 405)
+
+    def test_conditional_get(self):
+        '''ETag даёт 304, пока данные не изменились'''
+        url = reverse('api:post_detail', kwargs={'post_id': self.post.id})
+        response = self.guest_client.get(url)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Комментарий')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_follow_etag_changes_on_follow(self):
+        '''ETag ленты подписок меняется при подписке'''
+        url = reverse('api:follow_feed')
+        etag = self.reader_client.get(url)['ETag']
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
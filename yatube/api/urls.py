@@ -0,0 +1,13 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/', views.post_list, name='post_list'),
+    path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path('group/<slug:slug>/', views.group_feed, name='group_feed'),
+    path('profile/<str:username>/', views.profile_feed, name='profile_feed'),
+    path('follow/', views.follow_feed, name='follow_feed'),
+]
@@ -0,0 +1,101 @@
+from functools import wraps
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_safe
+
+from posts.caching import (AUTHOR, FEED, FOLLOWER, GROUP, POST, conditional,
+                           current_user, post_group)
+from posts.models import Group, Post, User
+from posts.timeline import TimelinePaginator
+from posts.utils import CursorPaginator, comments_arrange, feed_queryset
+from yatube.settings import POSTS_SHOW
+
+from .serializers import (AuthorSerializer, CommentSerializer,
+                          GroupSerializer, PostSerializer)
+
+
+def api_view(view_func):
+    """Только чтение; выбор полей поста параметром ?fields=id,text."""
+    @require_safe
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        fields = request.GET.get('fields')
+        try:
+            serializer = PostSerializer(fields.split(',') if fields else None)
+        except ValueError as error:
+            return JsonResponse(
+                {'detail': f'Неизвестные поля: {error}'}, status=400)
+        return view_func(request, serializer, *args, **kwargs)
+    return wrapper
+
+
+def login_required_json(view_func):
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse(
+                {'detail': 'Требуется авторизация'}, status=401)
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def feed(request, serializer, post_list, **extra):
+    paginator = CursorPaginator(feed_queryset(post_list), POSTS_SHOW)
+    return feed_page(request, serializer, paginator, **extra)
+
+
+def feed_page(request, serializer, paginator, **extra):
+    page = paginator.get_page(request.GET.get('cursor'))
+    return JsonResponse({
+        **extra,
+        'results': serializer.to_list(page),
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    })
+
+
+@api_view
+@conditional((FEED, None))
+def post_list(request, serializer):
+    return feed(request, serializer, Post.objects.all())
+
+
+@api_view
+@conditional((GROUP, 'slug'))
+def group_feed(request, serializer, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return feed(request, serializer, group.posts.all(),
+                group=GroupSerializer().to_dict(group))
+
+
+@api_view
+@conditional((AUTHOR, 'username'))
+def profile_feed(request, serializer, username):
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    return feed(request, serializer, author.posts.all(),
+                author=AuthorSerializer().to_dict(author))
+
+
+@login_required_json
+@api_view
+@conditional((FEED, None), (FOLLOWER, current_user))
+def follow_feed(request, serializer):
+    return feed_page(request, serializer,
+                     TimelinePaginator(request.user, POSTS_SHOW))
+
+
+@api_view
+@conditional((POST, 'post_id'), (GROUP, post_group))
+def post_detail(request, serializer, post_id):
+    """Пост и порция комментариев после ?cursor, как на странице поста."""
+    post = get_object_or_404(
+        feed_queryset(Post.objects.all()), id=post_id)
+    page = comments_arrange(request, post.comments.all())
+    return JsonResponse({
+        **serializer.to_dict(post),
+        'comments': CommentSerializer().to_list(page),
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    })
@@ -1,5 +1,11 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import deferred  # noqa: F401
+        from .db import apply_pragmas
+        connection_created.connect(apply_pragmas)
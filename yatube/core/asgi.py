@@ -0,0 +1,227 @@
+import asyncio
+import contextvars
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import unquote
+
+import django
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+
+from yatube.settings import ASGI_THREADS
+
+# очередь соединений, ещё не принятых сервером
+BACKLOG = 1024
+
+
+class AsgiHandler:
+    """ASGI-приложение поверх обработчика Django.
+
+    Django 2.2 не умеет асинхронные view, поэтому обработка запроса
+    (база и шаблоны) идёт в ограниченном пуле потоков, а приём тела
+    и отправка ответа — в цикле событий: медленный клиент не занимает
+    поток, пока шлёт запрос или читает ответ.
+
+    Ответ закрывается уже после отправки: на закрытии срабатывает
+    request_finished, а с ним и задачи после ответа. Обработка и
+    закрытие могут попасть в разные потоки пула, поэтому обе идут в
+    одном контексте запроса: в нём лежат очередь core.deferred и
+    маршрутизация реплик.
+    """
+
+    def __init__(self, threads=ASGI_THREADS):
+        self.handler = WSGIHandler()
+        self.executor = ThreadPoolExecutor(max_workers=threads,
+                                           thread_name_prefix='asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError(f'Неподдерживаемый тип {scope["type"]}')
+        body = await self.read_body(receive)
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        status, headers, response, content = await loop.run_in_executor(
+            self.executor, context.run, self.handle,
+            self.environ(scope, body))
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(name.lower().encode('latin1'),
+                         value.encode('latin1'))
+                        for name, value in headers],
+        })
+        if content is not None:
+            try:
+                await send({'type': 'http.response.body', 'body': content})
+            finally:
+                await loop.run_in_executor(self.executor, context.run,
+                                           response.close)
+            return
+        # потоковый ответ читает базу на каждом куске: курсор открыт на
+        # соединении одного потока, поэтому куски читает и ответ
+        # закрывает только отдельный поток этого ответа
+        stream = ThreadPoolExecutor(max_workers=1,
+                                    thread_name_prefix='asgi-stream')
+        chunks = iter(response)
+        try:
+            while True:
+                chunk = await loop.run_in_executor(
+                    stream, context.run, next, chunks, None)
+                if chunk is None:
+                    break
+                await send({'type': 'http.response.body',
+                            'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            await loop.run_in_executor(stream, context.run,
+                                       self.close_stream, response)
+            stream.shutdown(wait=False)
+
+    def handle(self, environ):
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = headers
+
+        response = self.handler(environ, start_response)
+        if response.streaming:
+            return started['status'], started['headers'], response, None
+        try:
+            content = b''.join(response)
+        except BaseException:
+            response.close()
+            raise
+        return started['status'], started['headers'], response, content
+
+    def close_stream(self, response):
+        try:
+            response.close()
+        finally:
+            # поток завершается, и постоянные соединения иначе не закрыть
+            connections.close_all()
+
+    async def read_body(self, receive):
+        body = b''
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        return body
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def environ(self, scope, body):
+        server_name, server_port = scope.get('server') or ('localhost', 80)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+            'SERVER_NAME': server_name,
+            'SERVER_PORT': str(server_port),
+            'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+            'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for raw_name, raw_value in scope.get('headers', []):
+            name = raw_name.decode('latin1').upper().replace('-', '_')
+            value = raw_value.decode('latin1')
+            if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                name = f'HTTP_{name}'
+            if name in environ:
+                value = f'{environ[name]},{value}'
+            environ[name] = value
+        return environ
+
+
+async def read_scope(reader, writer):
+    """Разбирает запрос HTTP/1.1 в scope ASGI и тело запроса."""
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None, b''
+    method, target, version = request_line.decode('latin1').split()
+    headers = []
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, value = line.decode('latin1').split(':', 1)
+        headers.append((name.strip().lower().encode('latin1'),
+                        value.strip().encode('latin1')))
+    length = int(dict(headers).get(b'content-length', 0))
+    body = await reader.readexactly(length) if length else b''
+    path, _, query = target.partition('?')
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': version.split('/')[-1],
+        'method': method,
+        'scheme': 'http',
+        'path': unquote(path),
+        'raw_path': path.encode('latin1'),
+        'query_string': query.encode('latin1'),
+        'root_path': '',
+        'headers': headers,
+        'client': writer.get_extra_info('peername')[:2],
+        'server': writer.get_extra_info('sockname')[:2],
+    }, body
+
+
+async def serve(app, host='127.0.0.1', port=8000):
+    """Простейший HTTP/1.1-сервер для ASGI: одно соединение — один запрос.
+
+    Нужен для замеров и локального запуска без сторонних пакетов;
+    в бою приложение запускается uvicorn или daphne.
+    """
+    async def connection(reader, writer):
+        async def receive():
+            return {'type': 'http.request', 'body': body,
+                    'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                writer.write(f'HTTP/1.1 {message["status"]} \r\n'.encode())
+                for name, value in message['headers']:
+                    writer.write(name + b': ' + value + b'\r\n')
+                writer.write(b'Connection: close\r\n\r\n')
+            else:
+                writer.write(message.get('body', b''))
+            await writer.drain()
+
+        try:
+            scope, body = await read_scope(reader, writer)
+            if scope is not None:
+                await app(scope, receive, send)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(connection, host, port,
+                                      backlog=BACKLOG)
+
+
+def get_asgi_application():
+    django.setup(set_prefix=False)
+    return AsgiHandler()
@@ -0,0 +1,434 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .sqlite import local_connection
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+'''
+# сколько ждать чужую запись, с
+BUSY_TIMEOUT = 5
+# время последнего чтения обновляется не чаще, чем раз в столько секунд:
+# иначе каждое чтение было бы записью
+ACCESS_RESOLUTION = 10
+# размер таблицы проверяется раз в столько записей процесса
+CULL_EVERY = 20
+# старые SQLite принимают не больше 999 параметров в запросе
+CHUNK = 500
+
+# TieredCache: сколько живёт копия в памяти процесса, с, и её предел, байт
+L1_TIMEOUT = 5
+L1_MAX_BYTES = 32 * 1024 * 1024
+# версии, метки изменения, замки и владельцы постов из posts.caching
+# и вёдра лимитов читаются только из L2
+L2_ONLY = ('version:', 'modified:', 'lock:', 'owner:', 'ratelimit:')
+# по смене эпохи в L2 процессы очищают L1; сверка не чаще раза в EPOCH_CHECK с
+EPOCH_KEY = 'tiered:epoch'
+EPOCH_CHECK = 1
+MISSING = object()
+
+
+class SQLiteCache(BaseCache):
+    """Кеш в файле SQLite, общий для всех процессов на машине.
+
+    LOCATION — путь к файлу. Кроме MAX_ENTRIES и CULL_FREQUENCY
+    принимает OPTIONS['MAX_BYTES'] — предел суммарного размера значений.
+    При переполнении удаляются давно не читавшиеся записи (LRU).
+    add и incr атомарны между процессами: на них держатся замки
+    и версии из posts.caching.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.location = location
+        self.max_bytes = params.get('OPTIONS', {}).get('MAX_BYTES')
+        self.local = threading.local()
+        self.writes = 0
+
+    @property
+    def connection(self):
+        return local_connection(self.local, self.location, BUSY_TIMEOUT,
+                                'NORMAL', SCHEMA)
+
+    def row(self, key, value, timeout):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        return (key, data, self.get_backend_timeout(timeout), time.time(),
+                len(data))
+
+    def make_and_validate_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version)
+        cursor = self.connection.execute(
+            'INSERT INTO cache VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+            'expires = excluded.expires, accessed = excluded.accessed, '
+            'size = excluded.size '
+            'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+            self.row(key, value, timeout) + (time.time(),),
+        )
+        added = cursor.rowcount > 0
+        if added:
+            self.maybe_cull()
+        return added
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version)
+        row = self.connection.execute(
+            'SELECT value, expires, accessed FROM cache WHERE key = ?',
+            (key,),
+        ).fetchone()
+        if row is None:
+            return default
+        value, expires, accessed = row
+        now = time.time()
+        if expires is not None and expires <= now:
+            self.connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, now))
+            return default
+        if accessed < now - ACCESS_RESOLUTION:
+            self.connection.execute(
+                'UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+        return pickle.loads(value)
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_and_validate_key(key, version): key
+                for key in keys}
+        found = {}
+        now = time.time()
+        names = list(keys)
+        for start in range(0, len(names), CHUNK):
+            chunk = names[start:start + CHUNK]
+            rows = self.connection.execute(
+                'SELECT key, value, accessed FROM cache WHERE key IN '
+                f'({", ".join("?" * len(chunk))}) '
+                'AND (expires IS NULL OR expires > ?)',
+                chunk + [now],
+            ).fetchall()
+            # как в get: версии читаются через get_many и иначе
+            # вытеснялись бы первыми
+            idle = [key for key, _, accessed in rows
+                    if accessed < now - ACCESS_RESOLUTION]
+            if idle:
+                self.connection.execute(
+                    'UPDATE cache SET accessed = ? WHERE key IN '
+                    f'({", ".join("?" * len(idle))})', [now] + idle)
+            for key, value, _ in rows:
+                found[keys[key]] = pickle.loads(value)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version)
+        self.connection.execute(
+            'INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)',
+            self.row(key, value, timeout),
+        )
+        self.maybe_cull()
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version)
+        cursor = self.connection.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version)
+        cursor = self.connection.execute(
+            'DELETE FROM cache WHERE key = ?', (key,))
+        return cursor.rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version)
+        return self.connection.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone() is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version)
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            connection.execute(
+                'UPDATE cache SET value = ?, size = ?, accessed = ? '
+                'WHERE key = ?', (data, len(data), time.time(), key))
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return value
+
+    def clear(self):
+        self.connection.execute('DELETE FROM cache')
+
+    def maybe_cull(self):
+        self.writes += 1
+        if self.writes % CULL_EVERY:
+            return
+        self.cull()
+
+    def cull(self):
+        """Удаляет просроченные записи, затем давно не читавшиеся."""
+        connection = self.connection
+        connection.execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?',
+            (time.time(),))
+        while True:
+            count, size = connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache'
+            ).fetchone()
+            over_bytes = self.max_bytes and size > self.max_bytes
+            if count <= self._max_entries and not over_bytes:
+                return
+            if self._cull_frequency == 0:
+                connection.execute('DELETE FROM cache')
+                return
+            victims = max(count // self._cull_frequency, 1)
+            if not over_bytes:
+                victims = max(victims, count - self._max_entries)
+            connection.execute(
+                'DELETE FROM cache WHERE key IN '
+                '(SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (victims,))
+
+
+class MemoryTier:
+    """LRU в памяти процесса, общий для всех потоков: размер в байтах
+    pickle значения, срок жизни не больше L1_TIMEOUT."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+        self.epoch = MISSING
+        self.next_sync = 0
+        self.hits = {'l1': 0, 'l2': 0}
+        self.misses = {'l1': 0, 'l2': 0}
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits['l1'] += 1
+                return entry[0]
+            if entry is not None:
+                self.drop(key)
+            self.misses['l1'] += 1
+            return MISSING
+
+    def set(self, key, value, timeout):
+        size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            self.drop(key)
+            self.entries[key] = (value, time.monotonic() + timeout, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                self.drop(next(iter(self.entries)))
+
+    def pop(self, key):
+        with self.lock:
+            self.drop(key)
+
+    def drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def count(self, tier, hit):
+        with self.lock:
+            (self.hits if hit else self.misses)[tier] += 1
+
+    def stats(self):
+        with self.lock:
+            stats = {}
+            for tier in ('l1', 'l2'):
+                hits, misses = self.hits[tier], self.misses[tier]
+                stats[tier] = {
+                    'hits': hits,
+                    'misses': misses,
+                    'hit_ratio': (round(hits / (hits + misses), 3)
+                                  if hits + misses else None),
+                }
+            stats['l1'].update(entries=len(self.entries), bytes=self.size)
+            return stats
+
+
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+class TieredCache(BaseCache):
+    """Небольшой LRU в памяти процесса перед общим кешем.
+
+    OPTIONS['L2'] — имя общего кеша в CACHES (или сам бэкенд),
+    L1_TIMEOUT и L1_MAX_BYTES — срок и размер копий в памяти. Как и у
+    LocMemCache, память общая для потоков с одинаковым LOCATION.
+
+    Версии из posts.caching читаются только из L2, а ключи страниц и
+    фрагментов содержат версии: после bump в любом процессе копии в L1
+    всех процессов просто перестают находиться. delete и clear
+    рассылаются через эпоху в L2, а перезапись set другим процессом
+    видна не позже чем через L1_TIMEOUT. Значения из L1 отдаются
+    без копирования, менять их нельзя.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.l2_cache = options.get('L2', 'shared')
+        self.l1_timeout = options.get('L1_TIMEOUT', L1_TIMEOUT)
+        with _tiers_lock:
+            self.l1 = _tiers.setdefault(location, MemoryTier(
+                options.get('L1_MAX_BYTES', L1_MAX_BYTES)))
+
+    @property
+    def l2(self):
+        if isinstance(self.l2_cache, BaseCache):
+            return self.l2_cache
+        return caches[self.l2_cache]
+
+    def in_l1(self, key):
+        return not key.startswith(L2_ONLY)
+
+    def l1_timeout_for(self, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            return self.l1_timeout
+        return min(self.l1_timeout, timeout - time.time())
+
+    def sync(self):
+        """Очищает L1, если другой процесс сменил эпоху."""
+        now = time.monotonic()
+        if now < self.l1.next_sync:
+            return
+        self.l1.next_sync = now + EPOCH_CHECK
+        epoch = self.l2.get(EPOCH_KEY)
+        if epoch != self.l1.epoch:
+            # при первой сверке в L1 только то, что процесс записал сам
+            if self.l1.epoch is not MISSING:
+                self.l1.clear()
+            self.l1.epoch = epoch
+
+    def broadcast(self):
+        self.l2.set(EPOCH_KEY, time.time_ns(), None)
+
+    def get(self, key, default=None, version=None):
+        if not self.in_l1(key):
+            return self.l2.get(key, default, version)
+        self.sync()
+        name = self.make_key(key, version)
+        value = self.l1.get(name)
+        if value is not MISSING:
+            return value
+        value = self.l2.get(key, MISSING, version)
+        self.l1.count('l2', value is not MISSING)
+        if value is MISSING:
+            return default
+        self.l1.set(name, value, self.l1_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        self.sync()
+        found = {}
+        missing = []
+        for key in keys:
+            value = (self.l1.get(self.make_key(key, version))
+                     if self.in_l1(key) else MISSING)
+            if value is MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        if not missing:
+            return found
+        fetched = self.l2.get_many(missing, version)
+        for key in missing:
+            if not self.in_l1(key):
+                continue
+            self.l1.count('l2', key in fetched)
+            if key in fetched:
+                self.l1.set(self.make_key(key, version), fetched[key],
+                            self.l1_timeout)
+        found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout, version)
+        if self.in_l1(key):
+            self.l1.set(self.make_key(key, version), value,
+                        self.l1_timeout_for(timeout))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout, version)
+        if added and self.in_l1(key):
+            self.l1.set(self.make_key(key, version), value,
+                        self.l1_timeout_for(timeout))
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        deleted = self.l2.delete(key, version)
+        if self.in_l1(key):
+            self.l1.pop(self.make_key(key, version))
+            self.broadcast()
+        return deleted
+
+    def has_key(self, key, version=None):
+        if self.in_l1(key):
+            self.sync()
+            if self.l1.get(self.make_key(key, version)) is not MISSING:
+                return True
+        return self.l2.has_key(key, version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.l2.incr(key, delta, version)
+        self.l1.pop(self.make_key(key, version))
+        return value
+
+    def clear(self):
+        self.l2.clear()
+        self.l1.clear()
+        self.broadcast()
+
+    def stats(self):
+        """Попадания по уровням; в L2 идут только промахи L1."""
+        return self.l1.stats()
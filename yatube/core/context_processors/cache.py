@@ -0,0 +1,9 @@
+from yatube.settings import CACHE_TTL
+
+
+def cache_version(request):
+    """Добавляет время жизни кеша и версию данных текущей страницы."""
+    return {
+        'cache_ttl': CACHE_TTL,
+        'cache_version': getattr(request, 'cache_version', ''),
+    }
@@ -0,0 +1,10 @@
+def apply_pragmas(sender, connection, **kwargs):
+    """Настраивает новое соединение SQLite по PRAGMAS из DATABASES.
+
+    Выполняется на сыром соединении, мимо обёрток Django: настройка
+    не попадает в счётчики запросов.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in connection.settings_dict.get('PRAGMAS', {}).items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,96 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextvars import ContextVar
+
+from django.core.signals import request_finished, request_started
+from django.db import connections, transaction
+from django.dispatch import receiver
+
+from yatube.settings import AFTER_RESPONSE_WORKERS
+
+logger = logging.getLogger(__name__)
+# задачи текущего запроса; None вне запроса
+pending = ContextVar('after_response', default=None)
+lock = threading.Lock()
+pool = {'pid': None, 'executor': None, 'futures': set()}
+
+
+def executor():
+    # пул свой у каждого процесса: потоки не переживают fork
+    with lock:
+        if pool['pid'] != os.getpid():
+            pool['executor'] = ThreadPoolExecutor(
+                max_workers=AFTER_RESPONSE_WORKERS,
+                thread_name_prefix='after-response')
+            pool['futures'] = set()
+            pool['pid'] = os.getpid()
+        return pool['executor']
+
+
+def run(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Ошибка в задаче после ответа %s%r',
+                         func.__name__, args)
+
+
+def work(func, *args):
+    try:
+        run(func, *args)
+    finally:
+        # поток пула не получает request_finished
+        connections.close_all()
+
+
+def done(future):
+    with lock:
+        pool['futures'].discard(future)
+
+
+def submit(func, *args):
+    future = executor().submit(work, func, *args)
+    with lock:
+        pool['futures'].add(future)
+    future.add_done_callback(done)
+    return future
+
+
+def drain():
+    """Ждёт задачи, уже отданные пулу: для тестов и остановки."""
+    with lock:
+        futures = set(pool['futures'])
+    wait(futures)
+
+
+@receiver(request_started)
+def open_queue(**kwargs):
+    pending.set({})
+
+
+@receiver(request_finished)
+def flush_queue(**kwargs):
+    """Отдаёт задачи запроса пулу, когда ответ уже отправлен клиенту."""
+    tasks = pending.get()
+    pending.set(None)
+    for func, args in tasks or ():
+        submit(func, *args)
+
+
+def after_response(func, *args):
+    """Откладывает func(*args) до фиксации транзакции и конца запроса.
+
+    Задачи выполняет пул из AFTER_RESPONSE_WORKERS потоков, поэтому ни
+    клиент, ни поток запроса их не ждут; одинаковые задачи запроса
+    сливаются в одну. Вне запроса (shell, команды) задача выполняется
+    сразу после фиксации.
+    """
+    def enqueue():
+        tasks = pending.get()
+        if tasks is None:
+            run(func, *args)
+        else:
+            tasks[func, args] = True
+    transaction.on_commit(enqueue)
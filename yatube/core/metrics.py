@@ -0,0 +1,108 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+
+# верхние границы корзин гистограмм, мс
+BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+current = contextvars.ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    """Счётчики одного запроса: база, кеш, шаблоны."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0.0
+        self.template_depth = 0
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - start
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def as_dict(self):
+        bounds = [str(bound) for bound in BUCKETS] + ['+Inf']
+        return {
+            'buckets': dict(zip(bounds, self.counts)),
+            'sum': round(self.sum, 3),
+            'count': self.count,
+        }
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.total = Histogram()
+        self.db = Histogram()
+        self.template = Histogram()
+        self.queries = Histogram()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+class Registry:
+    """Гистограммы по имени URL, общие для всех потоков процесса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def record(self, route, stats, total):
+        with self.lock:
+            metrics = self.routes.setdefault(route, RouteMetrics())
+            metrics.total.observe(total * 1000)
+            metrics.db.observe(stats.db_time * 1000)
+            metrics.template.observe(stats.template_time * 1000)
+            metrics.queries.observe(stats.queries)
+            metrics.cache_hits += stats.cache_hits
+            metrics.cache_misses += stats.cache_misses
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                route: {
+                    'total_ms': metrics.total.as_dict(),
+                    'db_ms': metrics.db.as_dict(),
+                    'template_ms': metrics.template.as_dict(),
+                    'queries': metrics.queries.as_dict(),
+                    'cache_hits': metrics.cache_hits,
+                    'cache_misses': metrics.cache_misses,
+                }
+                for route, metrics in self.routes.items()
+            }
+
+    def reset(self):
+        with self.lock:
+            self.routes.clear()
+
+
+registry = Registry()
+
+
+def record_cache(hit):
+    stats = current.get()
+    if stats is None:
+        return
+    if hit:
+        stats.cache_hits += 1
+    else:
+        stats.cache_misses += 1
@@ -0,0 +1,107 @@
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+from django.http import HttpResponse
+
+from yatube.settings import RATE_LIMITS, REPLICA_PIN_SECONDS
+
+from . import routers
+from .metrics import RequestStats, current, registry
+from .ratelimit import TokenBucket
+
+PIN_COOKIE = 'pin_primary'
+
+
+class ServerTimingMiddleware:
+    """Считает запросы к базе, кеш и шаблоны и отдаёт их в Server-Timing.
+
+    Те же замеры копятся в гистограммах по имени URL, см. core.views.metrics.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = current.set(stats)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(stats.db_wrapper))
+                response = self.get_response(request)
+        finally:
+            current.reset(token)
+        total = time.perf_counter() - start
+        match = request.resolver_match
+        route = match.view_name if match else 'unresolved'
+        registry.record(route, stats, total)
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={stats.db_time * 1000:.2f};'
+            f'desc="{stats.queries} queries"',
+            f'cache;desc="{stats.cache_hits} hits, '
+            f'{stats.cache_misses} misses"',
+            f'tpl;dur={stats.template_time * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ))
+        return response
+
+
+class ReplicaPinningMiddleware:
+    """Читает из основной базы REPLICA_PIN_SECONDS после записи клиента.
+
+    Реплика получает правку с задержкой: без закрепления автор после
+    редиректа не увидел бы свой пост или комментарий.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routing = routers.Routing(pinned=PIN_COOKIE in request.COOKIES)
+        token = routers.current.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.current.reset(token)
+        if routing.wrote:
+            response.set_cookie(PIN_COOKIE, '1', max_age=REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
+
+
+class RateLimitMiddleware:
+    """Отвечает 429 с Retry-After сверх RATE_LIMITS для имени URL.
+
+    Ведро своё у каждого пользователя, у гостей — у каждого IP.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.rules = {
+            name: (TokenBucket(name, rule['capacity'], rule['period']),
+                   rule['methods'])
+            for name, rule in RATE_LIMITS.items()
+        }
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        rule = self.rules.get(request.resolver_match.view_name)
+        if rule is None or request.method not in rule[1]:
+            return None
+        if request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = f'ip:{request.META.get("REMOTE_ADDR")}'
+        retry_after = rule[0].take(ident)
+        if not retry_after:
+            return None
+        response = HttpResponse('Слишком много запросов, повторите позже',
+                                content_type='text/plain; charset=utf-8',
+                                status=429)
+        response['Retry-After'] = str(retry_after)
+        return response
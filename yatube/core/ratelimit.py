@@ -0,0 +1,73 @@
+import math
+import time
+
+from django.core.cache import cache as default_cache
+
+
+class TokenBucket:
+    """Ведро токенов в кеше: capacity запросов подряд, затем capacity
+    за period секунд.
+
+    Состояние — окно: время отсчёта и число токенов, взятых с тех пор.
+    Токен берётся атомарным incr счётчика окна. Новое окно с долгом,
+    ещё не покрытым пополнением, заводится, когда в ведре набежал
+    лишний токен сверх capacity или окну больше period секунд: иначе
+    простой копил бы запас, а ключи истекли бы у активного клиента.
+    Окно сменяется только через add, поэтому параллельные запросы
+    попадают в одно и то же окно и не проходят сверх лимита.
+    """
+
+    def __init__(self, name, capacity, period, cache=default_cache):
+        self.name = name
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / period
+        self.cache = cache
+
+    def keys(self, ident, start):
+        """Счётчик окна и начало следующего за ним окна."""
+        used_key = f'ratelimit:{self.name}:{ident}:{start}'
+        return used_key, f'{used_key}:next'
+
+    def rebase(self, ident, now):
+        """Возвращает начало текущего окна, при нужде заводя новое."""
+        start_key = f'ratelimit:{self.name}:{ident}:start'
+        start = self.cache.get(start_key)
+        # указатель мог отстать от окна, заведённого другим запросом
+        while True:
+            used_key, next_key = self.keys(ident, start)
+            state = self.cache.get_many([used_key, next_key])
+            if next_key not in state:
+                break
+            start = state[next_key]
+        used = state.get(used_key)
+        if start is not None and now <= start:
+            return start
+        if used is not None and (
+                now - start <= self.period
+                and used + 1 > self.rate * (now - start)):
+            return start
+        debt = 0
+        if used is not None:
+            debt = max(math.ceil(used - self.rate * (now - start)), 0)
+        if not self.cache.add(next_key, now, 2 * self.period):
+            now = self.cache.get(next_key, now)
+        self.cache.add(self.keys(ident, now)[0], debt, 2 * self.period)
+        self.cache.set(start_key, now, 2 * self.period)
+        return now
+
+    def take(self, ident):
+        """Берёт токен; возвращает 0 или через сколько секунд повторить."""
+        now = time.time()
+        start = self.rebase(ident, now)
+        used_key, _ = self.keys(ident, start)
+        try:
+            used = self.cache.incr(used_key)
+        except ValueError:
+            # ключ вытеснили между чтением и incr: ведро снова полное
+            return 0
+        debt = used - self.rate * (now - start)
+        if debt <= self.capacity:
+            return 0
+        self.cache.decr(used_key)
+        return math.ceil((debt - self.capacity) / self.rate)
@@ -0,0 +1,91 @@
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from yatube.settings import DATABASE_REPLICAS, REPLICA_PIN_SECONDS
+
+# маршрутизация текущего запроса; вне запросов всё читается из основной базы
+current = ContextVar('replica_routing', default=None)
+
+
+class Routing:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+        # свежие реплики, проверяются один раз за запрос
+        self.replicas = None
+
+
+def has_replicas():
+    return bool(DATABASE_REPLICAS)
+
+
+def fresh_replicas():
+    """Реплики, файл которых скопирован не раньше REPLICA_PIN_SECONDS назад.
+
+    Изменения старше этого срока fresh_reads и закрепление клиента уже
+    читают из реплик: в отставшей копии их может не быть.
+    """
+    now = time.time()
+    fresh = []
+    for alias, path in DATABASE_REPLICAS.items():
+        try:
+            if now - os.path.getmtime(path) <= REPLICA_PIN_SECONDS:
+                fresh.append(alias)
+        except OSError:
+            pass
+    return fresh
+
+
+@contextmanager
+def primary():
+    """Внутри блока чтения текущего запроса идут в основную базу."""
+    routing = current.get()
+    if routing is None:
+        yield
+        return
+    pinned = routing.pinned
+    routing.pinned = True
+    try:
+        yield
+    finally:
+        routing.pinned = pinned or routing.wrote
+
+
+class ReplicaRouter:
+    """Чтения из запросов уходят в случайную реплику, записи — в основную базу.
+
+    Основная база читается вне запросов, внутри транзакций, в блоке
+    primary(), после записи в этом же запросе и когда все реплики
+    отстали, см. fresh_replicas. Клиента, недавно писавшего,
+    закрепляет за ней ReplicaPinningMiddleware.
+    """
+
+    def db_for_read(self, model, **hints):
+        routing = current.get()
+        if (routing is None or routing.pinned or not DATABASE_REPLICAS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        if routing.replicas is None:
+            routing.replicas = fresh_replicas()
+        if not routing.replicas:
+            return DEFAULT_DB_ALIAS
+        return random.choice(routing.replicas)
+
+    def db_for_write(self, model, **hints):
+        routing = current.get()
+        if routing is not None:
+            routing.wrote = True
+            routing.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # реплики — копии основной базы, схему получают вместе с данными
+        return db not in DATABASE_REPLICAS
@@ -0,0 +1,22 @@
+import os
+import sqlite3
+
+
+def local_connection(local, path, timeout, synchronous, schema,
+                     prepare=None):
+    """Соединение с файлом SQLite из local, своё у каждого потока.
+
+    Заново открывается после fork. Новое соединение переводится в WAL
+    и создаёт схему; prepare(connection) донастраивает его.
+    """
+    if getattr(local, 'pid', None) != os.getpid():
+        connection = sqlite3.connect(
+            path, timeout=timeout, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute(f'PRAGMA synchronous={synchronous}')
+        connection.executescript(schema)
+        if prepare is not None:
+            prepare(connection)
+        local.connection = connection
+        local.pid = os.getpid()
+    return local.connection
@@ -0,0 +1,40 @@
+import time
+
+from django.template.backends.django import DjangoTemplates
+
+from .metrics import current
+
+
+class TimedTemplate:
+    """Обёртка шаблона, которая копит время отрисовки в метриках запроса.
+
+    Вложенные отрисовки (render_to_string внутри шаблона) не считаются
+    повторно: время берётся только у внешней.
+    """
+
+    def __init__(self, template):
+        self.wrapped = template
+
+    def __getattr__(self, name):
+        return getattr(self.wrapped, name)
+
+    def render(self, context=None, request=None):
+        stats = current.get()
+        if stats is None:
+            return self.wrapped.render(context, request)
+        stats.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return self.wrapped.render(context, request)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:
+                stats.template_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
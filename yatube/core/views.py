@@ -1,5 +1,10 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import cache
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from .metrics import registry
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -7,3 +12,15 @@ def page_not_found(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@staff_member_required
+def metrics(request):
+    """Гистограммы времени ответа по имени URL для этого процесса.
+
+    Для двухуровневого кеша добавляется доля попаданий по уровням.
+    """
+    snapshot = registry.snapshot()
+    if hasattr(cache, 'stats'):
+        snapshot['cache_tiers'] = cache.stats()
+    return JsonResponse(snapshot)
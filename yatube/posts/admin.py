@@ -1,6 +1,10 @@
 from django.contrib import admin
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
+from django.urls import path
 
+from .export import EXPORTS, FORMATS, parse_watermark, render, rows
 from .models import Post, Group
+from .search import get_backend
 
 
 admin.site.register(Group)
@@ -18,6 +22,42 @@ class PostAdmin(admin.ModelAdmin):
     search_fields = ('text',)
     list_filter = ('pub_date', 'group')
     empty_value_display = '-пусто-'
+    search_limit = 1000
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        hits = get_backend().search(search_term, limit=self.search_limit)
+        return queryset.filter(id__in=[hit.post_id for hit in hits]), False
+
+    def get_urls(self):
+        return [
+            path('export/<str:kind>/',
+                 self.admin_site.admin_view(self.export_view),
+                 name='posts_export'),
+        ] + super().get_urls()
+
+    def export_view(self, request, kind):
+        """Потоковая выгрузка: ?format=ndjson|csv&since=<водяной знак>."""
+        if kind not in EXPORTS:
+            raise Http404
+        fmt = request.GET.get('format', 'ndjson')
+        if fmt not in FORMATS:
+            return HttpResponseBadRequest('Неизвестный формат')
+        since = request.GET.get('since')
+        try:
+            since = parse_watermark(kind, since) if since else None
+        except ValueError:
+            return HttpResponseBadRequest('Неверный водяной знак')
+        content_type = ('text/csv' if fmt == 'csv'
+                        else 'application/x-ndjson')
+        response = StreamingHttpResponse(
+            render(kind, rows(kind, since), fmt),
+            content_type=f'{content_type}; charset=utf-8',
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{kind}.{fmt}"')
+        return response
 
 
 admin.site.register(Post, PostAdmin)
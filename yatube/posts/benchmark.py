@@ -0,0 +1,310 @@
+import copy
+import json
+import math
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.client import HTTPConnection
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+from django.core.management import call_command
+from django.core.wsgi import get_wsgi_application
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+from faker import Faker
+
+from yatube.settings import DATABASE_PROFILE, DATABASE_PROFILES
+
+from . import counters, timeline
+from .models import Comment, Follow, Group, Post, User
+from .search import get_backend
+from .urls import app_name, urlpatterns
+
+# SQLite не принимает больше 500 строк в одном INSERT
+BATCH_SIZE = 100
+SCRATCH_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'benchmark'},
+}
+VOLUMES = {
+    'users': 100,
+    'groups': 10,
+    'posts': 1000,
+    'comments': 2000,
+    'follows': 500,
+}
+
+
+def seed(users, groups, posts, comments, follows, seed=0, prefix='bench'):
+    """Создаёт синтетические данные; при одном seed данные совпадают.
+
+    Записи создаются через bulk_create мимо сигналов, поэтому счётчики,
+    ленты подписок и поисковый индекс потом пересобираются целиком.
+    """
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed)
+    rnd = random.Random(seed)
+    User.objects.bulk_create(
+        [User(username=f'{prefix}{i}_{fake.user_name()}',
+              first_name=fake.first_name(), last_name=fake.last_name())
+         for i in range(max(users, 2))],
+        batch_size=BATCH_SIZE,
+    )
+    authors = list(User.objects.filter(
+        username__startswith=prefix).order_by('id'))
+    Group.objects.bulk_create(
+        [Group(title=fake.sentence(nb_words=3)[:200],
+               slug=f'{prefix}-{i}', description=fake.paragraph())
+         for i in range(groups)],
+        batch_size=BATCH_SIZE,
+    )
+    group_list = list(Group.objects.filter(
+        slug__startswith=f'{prefix}-').order_by('id'))
+    Post.objects.bulk_create(
+        [Post(text=fake.paragraph(nb_sentences=5),
+              author=rnd.choice(authors),
+              group=rnd.choice(group_list + [None]))
+         for _ in range(posts)],
+        batch_size=BATCH_SIZE,
+    )
+    post_ids = list(Post.objects.filter(
+        author__in=authors).values_list('id', flat=True))
+    if post_ids:
+        Comment.objects.bulk_create(
+            [Comment(post_id=rnd.choice(post_ids),
+                     author=rnd.choice(authors),
+                     text=fake.sentence())
+             for _ in range(comments)],
+            batch_size=BATCH_SIZE,
+        )
+    edges = {tuple(rnd.sample(authors, 2)) for _ in range(follows)}
+    Follow.objects.bulk_create(
+        [Follow(user=user, author=author) for user, author in edges],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    counters.rebuild()
+    for follow in Follow.objects.filter(
+            user__in=authors).select_related('user', 'author'):
+        timeline.backfill(follow.user, follow.author)
+    get_backend().rebuild()
+
+
+def attach(alias, config):
+    connections.databases[alias] = config
+    connections.ensure_defaults(alias)
+    connections.prepare_test_settings(alias)
+
+
+def scratch_config(directory, profile):
+    config = copy.deepcopy(DATABASE_PROFILES[profile])
+    config['NAME'] = os.path.join(directory, 'db.sqlite3')
+    return config
+
+
+def scratch_database(alias, directory, profile=DATABASE_PROFILE):
+    """Подключает под alias пустую базу профиля в каталоге и применяет
+    миграции: замеры с засевом не трогают рабочую базу."""
+    attach(alias, scratch_config(directory, profile))
+    call_command('migrate', database=alias, verbosity=0)
+    return alias
+
+
+def drop_database(alias):
+    connections[alias].close()
+    del connections.databases[alias]
+
+
+@contextmanager
+def scratch_default(directory, copy_data=False, profile=DATABASE_PROFILE):
+    """Подменяет базу default базой профиля в каталоге.
+
+    Прогон маршрутов пишет (подписки, счётчики, версии кеша), поэтому
+    и засев, и замер идут в подменной базе: пустой или, с copy_data,
+    копии рабочей. Кеш на это время свой, в памяти процесса, реплики
+    рабочей базы не читаются.
+    """
+    original = connections.databases[DEFAULT_DB_ALIAS]
+    connection = connections[DEFAULT_DB_ALIAS]
+    config = scratch_config(directory, profile)
+    if copy_data:
+        connection.ensure_connection()
+        with sqlite3.connect(config['NAME']) as target:
+            connection.connection.backup(target)
+    # соединение не закрывается: база в памяти пропала бы вместе с ним
+    del connections[DEFAULT_DB_ALIAS]
+    attach(DEFAULT_DB_ALIAS, config)
+    try:
+        with override_settings(CACHES=SCRATCH_CACHES, DATABASE_ROUTERS=[]):
+            call_command('migrate', verbosity=0)
+            yield
+    finally:
+        connections[DEFAULT_DB_ALIAS].close()
+        connections.databases[DEFAULT_DB_ALIAS] = original
+        connections[DEFAULT_DB_ALIAS] = connection
+
+
+def route_urls():
+    """Адреса всех маршрутов posts.urls на образцах из базы.
+
+    Зритель — автор поста, чтобы редактирование отдавало форму,
+    а профиль и подписка открываются на другого автора.
+    """
+    post = Post.objects.exclude(group=None).order_by('-id').first()
+    if post is None:
+        return None, []
+    author = User.objects.exclude(pk=post.author_id).order_by('id').first()
+    samples = {
+        'slug': post.group.slug,
+        'username': author.username,
+        'post_id': post.id,
+    }
+    urls = []
+    for pattern in urlpatterns:
+        kwargs = {name: samples[name]
+                  for name in pattern.pattern.converters}
+        urls.append((pattern.name,
+                     reverse(f'{app_name}:{pattern.name}', kwargs=kwargs)))
+    return post.author, urls
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(share * len(ordered)) - 1, 0)]
+
+
+def summarize(timings, elapsed, statuses):
+    return {
+        'requests': len(timings),
+        'rps': round(len(timings) / elapsed, 1),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'p50_ms': round(percentile(timings, 0.5), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'statuses': sorted(statuses),
+    }
+
+
+def measure(fetch, urls, repeat):
+    """Прогоняет каждый адрес repeat раз после одного прогревочного."""
+    results = {}
+    for name, url in urls:
+        fetch(url)
+        timings, statuses = [], set()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            statuses.add(fetch(url))
+            timings.append((time.perf_counter() - start) * 1000)
+        results[name] = summarize(
+            timings, time.perf_counter() - started, statuses)
+    return results
+
+
+def logged_client(user):
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+def run_client(urls, repeat, user):
+    client = logged_client(user)
+    return measure(lambda url: client.get(url).status_code, urls, repeat)
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def run_wsgi(urls, repeat, user):
+    """Замер через настоящий HTTP: wsgiref-сервер в соседнем потоке."""
+    session = logged_client(user).cookies['sessionid'].value
+    server = make_server('127.0.0.1', 0, get_wsgi_application(),
+                         handler_class=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+
+    def fetch(url):
+        connection = HTTPConnection(host, port)
+        try:
+            connection.request('GET', url,
+                               headers={'Cookie': f'sessionid={session}'})
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        finally:
+            connection.close()
+
+    try:
+        return measure(fetch, urls, repeat)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+TRANSPORTS = {
+    'client': run_client,
+    'wsgi': run_wsgi,
+}
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(transports, repeat):
+    viewer, urls = route_urls()
+    if viewer is None:
+        return None
+    return {
+        'commit': current_commit(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'repeat': repeat,
+        'counts': {
+            'users': User.objects.count(),
+            'groups': Group.objects.count(),
+            'posts': Post.objects.count(),
+            'comments': Comment.objects.count(),
+            'follows': Follow.objects.count(),
+        },
+        'results': {
+            transport: TRANSPORTS[transport](urls, repeat, viewer)
+            for transport in transports
+        },
+    }
+
+
+def compare(previous, current, metric='p50_ms'):
+    """Отношение метрики к прошлому прогону: > 1 — стало медленнее."""
+    ratios = {}
+    for transport, routes in current['results'].items():
+        before = previous.get('results', {}).get(transport, {})
+        for name, summary in routes.items():
+            if before.get(name, {}).get(metric):
+                ratios[f'{transport}:{name}'] = round(
+                    summary[metric] / before[name][metric], 2)
+    return ratios
+
+
+def dump(result, path):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(result, file, ensure_ascii=False, indent=2)
+
+
+def load(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
@@ -0,0 +1,263 @@
+import hashlib
+import math
+import random
+import time
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.core.cache import cache
+from django.views.decorators.http import condition
+
+from core.metrics import record_cache
+from core.routers import has_replicas, primary
+from yatube.settings import (CACHE_EARLY_EXPIRATION_BETA, CACHE_LOCK_TIMEOUT,
+                             CACHE_LOCK_WAIT, CACHE_TTL, REPLICA_PIN_SECONDS)
+
+from .models import Post
+from .personal import splice
+
+FEED = 'feed'
+POST = 'post'
+AUTHOR = 'author'
+GROUP = 'group'
+FOLLOWER = 'follower'
+# комментарии автора в очереди отложенной записи, см. posts.writebehind
+PENDING = 'pending'
+
+
+def version_key(scope, ident=None):
+    return f'version:{scope}:{ident}'
+
+
+def get_versions(deps):
+    """Возвращает строку текущих версий для пар (scope, ident).
+
+    Отсутствующая версия заводится от текущего времени, а не с единицы:
+    если ключ версии вытеснят из кеша, старые страницы не оживут.
+    """
+    keys = [version_key(*dep) for dep in deps]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def modified_key(scope, ident=None):
+    return f'modified:{scope}:{ident}'
+
+
+def get_modified(deps):
+    """Возвращает время последнего изменения пар (scope, ident), unix-время.
+
+    Для неизвестных пар временем изменения считается текущий момент.
+    """
+    keys = [modified_key(*dep) for dep in deps]
+    stamps = cache.get_many(keys)
+    for key in keys:
+        if key not in stamps:
+            cache.add(key, int(time.time()), None)
+            stamps[key] = cache.get(key)
+    return max(stamps.values())
+
+
+def bump(scope, ident=None):
+    """Сдвигает версию, делая недействительными все зависимые ключи."""
+    key = version_key(scope, ident)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+    cache.set(modified_key(scope, ident), int(time.time()), None)
+
+
+def fresh_reads(deps):
+    """Основная база для данных, изменённых не раньше REPLICA_PIN_SECONDS.
+
+    Иначе страница, собранная по отстающей реплике, легла бы в кеш
+    или получила ETag под уже новой версией.
+    """
+    if has_replicas() and (
+            time.time() - get_modified(deps) < REPLICA_PIN_SECONDS):
+        return primary()
+    return nullcontext()
+
+
+def current_user(request, kwargs):
+    return request.user.pk
+
+
+def owner_key(post_id):
+    return f'owner:post:{post_id}'
+
+
+def post_owner(post_id):
+    """Имя автора и slug группы поста для версий его страницы.
+
+    Пара лежит в кеше и обновляется сигналами при сохранении поста,
+    поэтому ответ 304 обходится без запроса к базе.
+    """
+    owner = cache.get(owner_key(post_id))
+    if owner is None:
+        owner = Post.objects.filter(pk=post_id).values_list(
+            'author__username', 'group__slug').first()
+        if owner is None:
+            return None, None
+        cache.set(owner_key(post_id), owner, None)
+    return owner
+
+
+def post_author(request, kwargs):
+    return post_owner(kwargs['post_id'])[0]
+
+
+def post_group(request, kwargs):
+    return post_owner(kwargs['post_id'])[1]
+
+
+def resolve(deps, request, kwargs):
+    """Подставляет в пары (scope, имя) значения из адреса или запроса."""
+    resolved = []
+    for scope, name in deps:
+        if callable(name):
+            resolved.append((scope, name(request, kwargs)))
+        else:
+            resolved.append((scope, kwargs.get(name) if name else None))
+    return resolved
+
+
+def conditional(*deps):
+    """ETag и Last-Modified по версиям данных, от которых зависит ответ.
+
+    Версии сдвигаются сигналами моделей, поэтому ответ 304 отдаётся
+    без запросов к базе и без рендера. В ETag входят адрес с
+    параметрами и пользователь: личные куски страниц и лента
+    подписок у каждого свои.
+    """
+    def etag(request, *args, **kwargs):
+        versions = get_versions(resolve(deps, request, kwargs))
+        raw = f'{request.get_full_path()}|{request.user.pk}|{versions}'
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        return datetime.fromtimestamp(
+            get_modified(resolve(deps, request, kwargs)), tz=timezone.utc)
+
+    def decorator(view_func):
+        @condition(etag_func=etag, last_modified_func=last_modified)
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            with fresh_reads(resolve(deps, request, kwargs)):
+                return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def should_refresh(expires, delta, beta=CACHE_EARLY_EXPIRATION_BETA):
+    """Вероятностное раннее истечение (XFetch).
+
+    Чем ближе срок и чем дольше запись считалась (delta), тем вероятнее
+    один из запросов пересоберёт её заранее, пока остальные получают
+    ещё действительную копию.
+    """
+    jitter = -delta * beta * math.log(1 - random.random())
+    return time.time() + jitter >= expires
+
+
+def get_or_compute(key, compute, timeout=CACHE_TTL, stale_key=None,
+                   cacheable=lambda value: True):
+    """Берёт значение из кеша или считает его, защищая от наплыва.
+
+    Пересчитывает только запрос, взявший замок cache.add; остальные
+    отдают старую копию из stale_key (она живёт дольше смены версий),
+    а если её нет — ждут CACHE_LOCK_WAIT секунд и считают сами.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        value, expires, delta = entry
+        if not should_refresh(expires, delta):
+            record_cache(True)
+            return value
+    lock = f'lock:{key}'
+    if not cache.add(lock, True, CACHE_LOCK_TIMEOUT):
+        value = entry[0] if entry else wait_for(key, stale_key)
+        if value is not None:
+            record_cache(True)
+            return value
+    record_cache(False)
+    try:
+        start = time.time()
+        value = compute()
+        if cacheable(value):
+            delta = time.time() - start
+            cache.set(key, (value, time.time() + timeout, delta), timeout)
+            if stale_key:
+                cache.set(stale_key, value, timeout)
+    finally:
+        cache.delete(lock)
+    return value
+
+
+def wait_for(key, stale_key):
+    if stale_key:
+        stale = cache.get(stale_key)
+        if stale is not None:
+            return stale
+    deadline = time.time() + CACHE_LOCK_WAIT
+    while time.time() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+    return None
+
+
+def path_hash(request):
+    return hashlib.md5(request.get_full_path().encode()).hexdigest()
+
+
+def page_key(request, versions):
+    return f'page:{path_hash(request)}:{versions}'
+
+
+def stale_page_key(request):
+    return f'page:{path_hash(request)}:stale'
+
+
+def cache_versioned_page(*deps, timeout=CACHE_TTL):
+    """Кеширует страницу под ключом с версиями данных, от которых она зависит.
+
+    deps — пары (scope, имя аргумента view), (scope, None) для всей ленты
+    или (scope, функция), как в conditional.
+    Версии сдвигаются сигналами моделей, поэтому новые записи видны сразу,
+    а время жизни кеша можно держать большим. В кеше лежит одна общая
+    копия страницы с метками {% personal %}: куски конкретного
+    пользователя подставляются при каждом ответе. Пересборку после
+    смены версии делает один запрос, см. get_or_compute.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+            resolved = resolve(deps, request, kwargs)
+            request.cache_version = get_versions(resolved)
+
+            def render():
+                request.splice_personal = True
+                with fresh_reads(resolved):
+                    return view_func(request, *args, **kwargs)
+
+            response = get_or_compute(
+                page_key(request, request.cache_version), render, timeout,
+                stale_key=stale_page_key(request),
+                cacheable=lambda response: (
+                    response.status_code == 200 and not response.cookies),
+            )
+            if response.status_code != 200:
+                return response
+            return splice(request, response)
+        return wrapper
+    return decorator
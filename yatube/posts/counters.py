@@ -0,0 +1,67 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import AuthorStats, Comment, Follow, Post, PostStats, User
+from . import timeline
+
+
+def change(model, pk, field, delta):
+    """Сдвигает счётчик одним UPDATE в транзакции записи.
+
+    Сигналы зовут change внутри транзакции save()/delete() (см.
+    CountedModel), так что сбой счётчика откатывает и саму запись.
+
+    Строка счётчиков заводится при прибавлении, если её ещё нет;
+    убавление ниже нуля пропускается — такие расхождения чинит
+    команда rebuild_counters.
+    """
+    with transaction.atomic():
+        rows = model.objects.filter(pk=pk)
+        if delta < 0:
+            rows = rows.filter(**{f'{field}__gte': -delta})
+        updated = rows.update(**{field: F(field) + delta})
+        if not updated and delta > 0:
+            model.objects.get_or_create(pk=pk)
+            rows.update(**{field: F(field) + delta})
+
+
+def count_of(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+COUNTERS = (
+    (AuthorStats, 'posts_count', count_of(Post.objects, 'author')),
+    (AuthorStats, 'followers_count', count_of(Follow.objects, 'author')),
+    (AuthorStats, 'following_count', count_of(Follow.objects, 'user')),
+    (PostStats, 'comments_count', count_of(Comment.objects, 'post')),
+)
+
+
+def rebuild():
+    """Пересчитывает все счётчики по данным; возвращает число исправлений."""
+    AuthorStats.objects.bulk_create(
+        [AuthorStats(user_id=pk)
+         for pk in User.objects.filter(
+             stats__isnull=True).values_list('pk', flat=True)],
+        batch_size=500,
+    )
+    PostStats.objects.bulk_create(
+        [PostStats(post_id=pk)
+         for pk in Post.objects.filter(
+             stats__isnull=True).values_list('pk', flat=True)],
+        batch_size=500,
+    )
+    fixed = {}
+    for model, field, expression in COUNTERS:
+        with transaction.atomic():
+            drifted = model.objects.annotate(
+                actual=expression).exclude(**{field: F('actual')})
+            fixed[field] = drifted.count()
+            model.objects.update(**{field: expression})
+    # режим раскладки лент зависит от followers_count
+    timeline.sync_modes()
+    return fixed
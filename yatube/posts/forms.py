@@ -1,6 +1,7 @@
 from django import forms
 
 from .models import Post, Comment
+from .thumbnails import schedule
 
 
 class PostForm(forms.ModelForm):
@@ -13,6 +14,12 @@ class PostForm(forms.ModelForm):
             'group': forms.Select()
         }
 
+    def save(self, commit=True):
+        post = super().save(commit)
+        if commit and post.image and 'image' in self.changed_data:
+            schedule(post.image.name)
+        return post
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
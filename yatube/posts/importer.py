@@ -0,0 +1,304 @@
+import json
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from yatube.settings import IMPORT_BATCH_SIZE
+
+from . import caching, counters, timeline
+from .models import Comment, Follow, Group, Post, User
+from .search import get_backend
+
+# старые SQLite принимают не больше 999 параметров в запросе
+LOOKUP_CHUNK = 500
+# целые в SQLite 64-битные: больший id ломает всю пачку в bulk_create
+MAX_ID = 2 ** 63 - 1
+TYPE_NAMES = {str: 'строка', int: 'целое число'}
+
+
+@contextmanager
+def keep_dates(model, field_name):
+    """Сохраняет даты из файла: иначе auto_now_add подставит текущую."""
+    field = model._meta.get_field(field_name)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def chunked(items, size=LOOKUP_CHUNK):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def parse_date(value):
+    """Дата из файла; без даты — текущий момент, без пояса — UTC."""
+    if not value:
+        return timezone.now()
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(f'неверная дата {value}')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, timezone.utc)
+    return moment
+
+
+def field(record, name, kind, required=True):
+    """Поле строки файла нужного типа; None, если необязательного нет."""
+    value = record.get(name)
+    if value is None and not required:
+        return None
+    # bool в Python — подкласс int
+    if not isinstance(value, kind) or isinstance(value, bool):
+        raise ValueError(f'поле {name}: ожидается {TYPE_NAMES[kind]}')
+    return value
+
+
+def id_field(record, name='id', required=False):
+    value = field(record, name, int, required)
+    if value is not None and not 0 < value <= MAX_ID:
+        raise ValueError(f'поле {name}: неверный id {value}')
+    return value
+
+
+def is_id(value):
+    return (isinstance(value, int) and not isinstance(value, bool)
+            and 0 < value <= MAX_ID)
+
+
+class Importer:
+    """Загружает строки NDJSON пачками через bulk_create.
+
+    Авторы и группы ищутся по username и slug одним запросом на пачку,
+    найденные id запоминаются. Строки с ошибками пропускаются и
+    попадают в errors с номером строки, а строки, которые уже есть
+    в базе по unique_fields, — в duplicates. Сигналы при bulk_create не
+    срабатывают, поэтому счётчики, ленты, поиск и версии кеша
+    пересобираются в finish().
+    """
+
+    model = None
+    date_field = None
+    unique_fields = ('id',)
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.users = {}
+        self.groups = {}
+        self.accepted = 0
+        self.duplicates = 0
+        self.errors = []
+        self.authors = set()
+        self.slugs = set()
+
+    def lookup(self, known, model, field, keys):
+        missing = {key for key in keys
+                   if isinstance(key, str) and key and key not in known}
+        for chunk in chunked(missing):
+            known.update(model.objects.filter(
+                **{f'{field}__in': chunk}).values_list(field, 'id'))
+
+    def resolve_user(self, username):
+        if username not in self.users:
+            raise ValueError(f'нет пользователя {username}')
+        return self.users[username]
+
+    def prefetch(self, records):
+        raise NotImplementedError
+
+    def build(self, record):
+        raise NotImplementedError
+
+    def load(self, lines):
+        batch = []
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if isinstance(record, dict):
+                batch.append((number, record))
+            else:
+                self.errors.append((number, 'ожидался объект JSON'))
+            if len(batch) >= self.batch_size:
+                self.insert(batch)
+                batch = []
+        if batch:
+            self.insert(batch)
+
+    def insert(self, batch):
+        self.prefetch([record for _, record in batch])
+        objects = []
+        for number, record in batch:
+            try:
+                objects.append(self.build(record))
+            except (KeyError, TypeError, ValueError) as error:
+                self.errors.append((number, str(error)))
+        objects = self.fresh(objects)
+        with transaction.atomic():
+            if self.date_field:
+                with keep_dates(self.model, self.date_field):
+                    self.model.objects.bulk_create(
+                        objects, ignore_conflicts=True)
+            else:
+                self.model.objects.bulk_create(
+                    objects, ignore_conflicts=True)
+        self.accepted += len(objects)
+
+    def fresh(self, objects):
+        """Отбрасывает строки, которые уже есть в базе или в пачке.
+
+        ignore_conflicts молча пропустил бы их, и accepted завысил бы
+        скорость загрузки. Сравнение по первому из unique_fields
+        укладывается в запрос на LOOKUP_CHUNK значений.
+        """
+        keys = [tuple(getattr(obj, name) for name in self.unique_fields)
+                for obj in objects]
+        first = self.unique_fields[0]
+        seen = set()
+        for chunk in chunked({key[0] for key in keys if None not in key}):
+            seen.update(self.model.objects.filter(
+                **{f'{first}__in': chunk}).values_list(*self.unique_fields))
+        kept = []
+        for obj, key in zip(objects, keys):
+            if None in key:
+                kept.append(obj)
+            elif key not in seen:
+                seen.add(key)
+                kept.append(obj)
+        self.duplicates += len(objects) - len(kept)
+        return kept
+
+    def finish(self):
+        counters.rebuild()
+        caching.bump(caching.FEED)
+        for username in self.authors:
+            caching.bump(caching.AUTHOR, username)
+        for slug in self.slugs:
+            caching.bump(caching.GROUP, slug)
+
+
+class PostImporter(Importer):
+    model = Post
+    date_field = 'pub_date'
+
+    def prefetch(self, records):
+        self.lookup(self.users, User, 'username',
+                    [record.get('author__username') for record in records])
+        self.lookup(self.groups, Group, 'slug',
+                    [record.get('group__slug') for record in records])
+
+    def build(self, record):
+        text = field(record, 'text', str)
+        if not text.strip():
+            raise ValueError('пустой текст')
+        username = field(record, 'author__username', str)
+        slug = field(record, 'group__slug', str, required=False)
+        if slug and slug not in self.groups:
+            raise ValueError(f'нет группы {slug}')
+        post = Post(
+            id=id_field(record),
+            text=text,
+            author_id=self.resolve_user(username),
+            group_id=self.groups[slug] if slug else None,
+            image=field(record, 'image', str, required=False) or '',
+        )
+        post.pub_date = parse_date(
+            field(record, 'pub_date', str, required=False))
+        self.authors.add(username)
+        if slug:
+            self.slugs.add(slug)
+        return post
+
+    def finish(self):
+        super().finish()
+        get_backend().rebuild()
+        for chunk in chunked(self.authors):
+            timeline.refill(Follow.objects.filter(
+                author__username__in=chunk))
+
+
+class CommentImporter(Importer):
+    model = Comment
+    date_field = 'created'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.posts = set()
+
+    def prefetch(self, records):
+        self.lookup(self.users, User, 'username',
+                    [record.get('author__username') for record in records])
+        self.existing = set()
+        for chunk in chunked({record.get('post_id') for record in records
+                              if is_id(record.get('post_id'))}):
+            self.existing.update(Post.objects.filter(
+                id__in=chunk).values_list('id', flat=True))
+
+    def build(self, record):
+        post_id = id_field(record, 'post_id', required=True)
+        if post_id not in self.existing:
+            raise ValueError(f'нет поста {post_id}')
+        text = field(record, 'text', str)
+        if not text.strip():
+            raise ValueError('пустой текст')
+        comment = Comment(
+            id=id_field(record),
+            post_id=post_id,
+            author_id=self.resolve_user(
+                field(record, 'author__username', str)),
+            text=text,
+        )
+        comment.created = parse_date(
+            field(record, 'created', str, required=False))
+        self.posts.add(post_id)
+        return comment
+
+    def finish(self):
+        super().finish()
+        for post_id in self.posts:
+            caching.bump(caching.POST, post_id)
+
+
+class FollowImporter(Importer):
+    model = Follow
+    unique_fields = ('user_id', 'author_id')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.followers = set()
+
+    def prefetch(self, records):
+        self.lookup(self.users, User, 'username',
+                    [record.get(field) for record in records
+                     for field in ('user__username', 'author__username')])
+
+    def build(self, record):
+        user_id = self.resolve_user(field(record, 'user__username', str))
+        username = field(record, 'author__username', str)
+        author_id = self.resolve_user(username)
+        if user_id == author_id:
+            raise ValueError('подписка на себя')
+        self.authors.add(username)
+        self.followers.add(user_id)
+        return Follow(user_id=user_id, author_id=author_id)
+
+    def finish(self):
+        super().finish()
+        for user_id in self.followers:
+            caching.bump(caching.FOLLOWER, user_id)
+        for chunk in chunked(self.followers):
+            timeline.refill(Follow.objects.filter(user_id__in=chunk))
+
+
+IMPORTERS = {
+    'posts': PostImporter,
+    'comments': CommentImporter,
+    'follows': FollowImporter,
+}
@@ -0,0 +1,118 @@
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from yatube.settings import CACHE_BACKENDS
+
+HOT_KEYS = 100
+
+
+def make_cache(name, directory):
+    """Бэкенд из CACHE_BACKENDS, но с файлами во временном каталоге."""
+    config = dict(CACHE_BACKENDS[name])
+    options = config.get('OPTIONS', {})
+    if 'L2' in options:
+        config['OPTIONS'] = {
+            **options, 'L2': make_cache(options['L2'], directory)}
+    if 'LOCATION' in config:
+        config['LOCATION'] = os.path.join(
+            directory, os.path.basename(config['LOCATION']))
+    backend = import_string(config.pop('BACKEND'))
+    return backend(config.pop('LOCATION', name), config)
+
+
+def timed(operation, repeat):
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        operation(i)
+        timings.append((time.perf_counter() - start) * 1_000_000)
+    return statistics.median(timings)
+
+
+def operations(cache, payload, repeat):
+    """Медиана одной операции в микросекундах."""
+    results = {}
+    cache.clear()
+    results['set'] = timed(
+        lambda i: cache.set(f'key:{i}', payload), repeat)
+    # горячих ключей меньше MAX_ENTRIES по умолчанию, чтобы их не вытеснило
+    cache.clear()
+    for i in range(HOT_KEYS):
+        cache.set(f'hit:{i}', payload)
+    keys = [f'hit:{i}' for i in range(10)]
+    results['get_hit'] = timed(
+        lambda i: cache.get(f'hit:{i % HOT_KEYS}'), repeat)
+    results['get_miss'] = timed(lambda i: cache.get(f'miss:{i}'), repeat)
+    results['get_many_10'] = timed(lambda i: cache.get_many(keys), repeat)
+    cache.set('counter', 0)
+    results['incr'] = timed(lambda i: cache.incr('counter'), repeat)
+    results['add'] = timed(
+        lambda i: cache.add(f'lock:{i % HOT_KEYS}', True), repeat)
+    return results
+
+
+def share_worker(name, directory, number, processes, keys, barrier, queue):
+    cache = make_cache(name, directory)
+    for i in range(keys):
+        cache.set(f'page:{number}:{i}', b'x')
+    barrier.wait()
+    found = len(cache.get_many(
+        [f'page:{n}:{i}' for n in range(processes) for i in range(keys)]))
+    queue.put(found / (processes * keys))
+
+
+def shared_hit_rate(name, directory, processes, keys):
+    """Доля ключей, записанных любым процессом, которую видит каждый."""
+    context = multiprocessing.get_context('fork')
+    barrier = context.Barrier(processes)
+    queue = context.Queue()
+    workers = [
+        context.Process(target=share_worker, args=(
+            name, directory, number, processes, keys, barrier, queue))
+        for number in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    rates = [queue.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    return statistics.mean(rates)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает бэкенды кеша из CACHE_BACKENDS: задержки операций '
+            'и долю попаданий, общую для нескольких процессов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', nargs='+', choices=CACHE_BACKENDS,
+                            default=list(CACHE_BACKENDS))
+        parser.add_argument('--repeat', type=int, default=1000)
+        parser.add_argument('--size', type=int, default=16 * 1024,
+                            help='Размер значения, байт: как у страницы')
+        parser.add_argument('--processes', type=int, default=4)
+
+    def handle(self, *args, **options):
+        payload = os.urandom(options['size'])
+        for name in options['backend']:
+            with tempfile.TemporaryDirectory() as directory:
+                cache = make_cache(name, directory)
+                timings = operations(cache, payload, options['repeat'])
+                rate = shared_hit_rate(name, directory,
+                                       options['processes'], 100)
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for operation, median in timings.items():
+                self.stdout.write(f'    {operation}: {median:.1f} мкс')
+            self.stdout.write(
+                f'    попадания при {options["processes"]} процессах: '
+                f'{rate:.0%}')
+            if hasattr(cache, 'stats'):
+                for tier, stats in cache.stats().items():
+                    self.stdout.write(
+                        f'    {tier}: {stats["hits"]} попаданий, '
+                        f'{stats["misses"]} промахов')
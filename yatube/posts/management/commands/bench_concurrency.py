@@ -0,0 +1,157 @@
+import asyncio
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIServer
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+
+from core.asgi import BACKLOG, AsgiHandler, serve
+from posts import benchmark
+from yatube.settings import ASGI_THREADS
+
+READ_ROUTES = ('index', 'group_list', 'profile', 'post_detail',
+               'follow_index')
+HOST = '127.0.0.1'
+READ_SIZE = 4096
+
+
+class PooledWSGIServer(WSGIServer):
+    """wsgiref с пулом потоков: как синхронный воркер с N потоками.
+
+    Поток занят всё время запроса, в том числе пока клиент шлёт
+    заголовки и читает ответ.
+    """
+
+    request_queue_size = BACKLOG
+
+    def __init__(self, address, handler_class, threads):
+        super().__init__(address, handler_class)
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_in_thread, request, client_address)
+
+    def process_in_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def start_wsgi(threads):
+    server = PooledWSGIServer((HOST, 0), benchmark.QuietHandler, threads)
+    server.set_app(get_wsgi_application())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def stop():
+        server.shutdown()
+        server.server_close()
+        server.executor.shutdown()
+    return server.server_address[1], stop
+
+
+def start_asgi(threads):
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(
+        serve(AsgiHandler(threads), HOST, 0))
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    def stop():
+        loop.call_soon_threadsafe(server.close)
+        loop.call_soon_threadsafe(loop.stop)
+    return server.sockets[0].getsockname()[1], stop
+
+
+SERVERS = {
+    'wsgi': start_wsgi,
+    'asgi': start_asgi,
+}
+
+
+async def fetch(port, url, cookie, delay):
+    """Медленный клиент: читает ответ кусками READ_SIZE с паузой delay.
+
+    Маленький приёмный буфер не даёт ядру проглотить страницу целиком,
+    поэтому сервер ждёт клиента, как на медленной мобильной сети.
+    """
+    start = time.perf_counter()
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, READ_SIZE)
+    sock.setblocking(False)
+    await asyncio.get_running_loop().sock_connect(sock, (HOST, port))
+    reader, writer = await asyncio.open_connection(sock=sock,
+                                                   limit=READ_SIZE)
+    writer.write((f'GET {url} HTTP/1.1\r\nHost: {HOST}\r\n'
+                  f'Cookie: sessionid={cookie}\r\n\r\n').encode())
+    data = b''
+    while True:
+        chunk = await reader.read(READ_SIZE)
+        if not chunk:
+            break
+        data += chunk
+        await asyncio.sleep(delay)
+    writer.close()
+    return int(data.split(b' ', 2)[1]), (time.perf_counter() - start) * 1000
+
+
+async def load(port, urls, cookie, clients, requests, delay):
+    async def client(number):
+        return [await fetch(port, urls[(number + i) % len(urls)],
+                            cookie, delay)
+                for i in range(requests)]
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(client(n) for n in range(clients)))
+    elapsed = time.perf_counter() - started
+    statuses, timings = zip(*(item for batch in results for item in batch))
+    return benchmark.summarize(list(timings), elapsed, set(statuses))
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность WSGI и ASGI при множестве '
+            'одновременных медленных клиентов. Данные готовит команда '
+            'benchmark.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=64)
+        parser.add_argument('--requests', type=int, default=5,
+                            help='Запросов на клиента')
+        parser.add_argument('--delay', type=float, default=0.01,
+                            help='Пауза клиента между кусками ответа, с')
+        parser.add_argument('--threads', type=int, default=ASGI_THREADS)
+        parser.add_argument('--server', nargs='+', choices=SERVERS,
+                            default=list(SERVERS))
+        parser.add_argument('--output', help='Куда сохранить JSON')
+
+    def handle(self, *args, **options):
+        viewer, urls = benchmark.route_urls()
+        if viewer is None:
+            raise CommandError('Нет данных: запустите benchmark')
+        urls = [url for name, url in urls if name in READ_ROUTES]
+        cookie = benchmark.logged_client(viewer).cookies['sessionid'].value
+        results = {}
+        for name in options['server']:
+            port, stop = SERVERS[name](options['threads'])
+            try:
+                results[name] = asyncio.run(load(
+                    port, urls, cookie, options['clients'],
+                    options['requests'], options['delay']))
+            finally:
+                stop()
+            summary = results[name]
+            self.stdout.write(
+                f'{name}: {summary["rps"]} rps, '
+                f'p50 {summary["p50_ms"]} мс, p99 {summary["p99_ms"]} мс, '
+                f'статусы {summary["statuses"]}')
+        if options['output']:
+            benchmark.dump({
+                'commit': benchmark.current_commit(),
+                'options': {key: options[key] for key in (
+                    'clients', 'requests', 'delay', 'threads')},
+                'results': results,
+            }, options['output'])
@@ -0,0 +1,127 @@
+import tempfile
+import threading
+import time
+from functools import partial
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+
+from posts import benchmark
+from posts.models import Comment, Group, Post, User
+from yatube.settings import DATABASE_PROFILES
+
+POSTS = 2000
+
+
+def open_profile(name, directory):
+    """Подключает профиль из DATABASE_PROFILES к пустой базе в каталоге.
+
+    Возвращает имя подключения и id автора для записей.
+    """
+    alias = benchmark.scratch_database(f'bench_{name}', directory, name)
+    # bulk_create не шлёт сигналов: они пишут в основную базу
+    User.objects.using(alias).bulk_create([User(username='bench')])
+    Group.objects.using(alias).bulk_create(
+        [Group(title='bench', slug='bench', description='bench')])
+    author = User.objects.using(alias).get(username='bench')
+    group = Group.objects.using(alias).get(slug='bench')
+    Post.objects.using(alias).bulk_create(
+        [Post(text=f'Пост {number}', author=author, group=group)
+         for number in range(POSTS)], batch_size=500)
+    connections[alias].close()
+    return alias, author.pk
+
+
+def read(alias):
+    list(Post.objects.using(alias).select_related('author', 'group')
+         .order_by('-pub_date')[:10])
+
+
+def write(alias, author_id):
+    # как add_comment: пост читается до записи, запись — отдельной транзакцией
+    post_id = Post.objects.using(alias).values_list(
+        'id', flat=True).order_by('-id')[0]
+    Comment.objects.using(alias).bulk_create(
+        [Comment(post_id=post_id, author_id=author_id, text='Ответ')])
+
+
+def worker(alias, operation, deadline, results):
+    timings, statuses = [], set()
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            operation()
+            statuses.add('ok')
+        except OperationalError as error:
+            statuses.add(str(error))
+        timings.append((time.perf_counter() - start) * 1000)
+        # как request_finished: без CONN_MAX_AGE соединение закрывается
+        connections[alias].close_if_unusable_or_obsolete()
+    connections[alias].close()
+    results.append((timings, statuses))
+
+
+def run(alias, author_id, readers, writers, duration):
+    deadline = time.perf_counter() + duration
+    results = {'read': [], 'write': []}
+    threads = [
+        threading.Thread(target=worker, args=(
+            alias, partial(read, alias), deadline, results['read']))
+        for _ in range(readers)
+    ] + [
+        threading.Thread(target=worker, args=(
+            alias, partial(write, alias, author_id), deadline,
+            results['write']))
+        for _ in range(writers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    summary = {}
+    for kind, batches in results.items():
+        timings = [value for batch, _ in batches for value in batch]
+        statuses = set().union(*(batch for _, batch in batches))
+        if timings:
+            summary[kind] = benchmark.summarize(timings, duration, statuses)
+    return summary
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает профили DATABASE_PROFILES: чтение ленты и запись '
+            'комментариев из нескольких потоков на отдельной базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', nargs='+', choices=DATABASE_PROFILES,
+                            default=list(DATABASE_PROFILES))
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--duration', type=float, default=3,
+                            help='Длительность замера, с')
+        parser.add_argument('--output', help='Куда сохранить JSON')
+
+    def handle(self, *args, **options):
+        results = {}
+        for name in options['profile']:
+            with tempfile.TemporaryDirectory() as directory:
+                alias, author_id = open_profile(name, directory)
+                try:
+                    results[name] = run(alias, author_id, options['readers'],
+                                        options['writers'],
+                                        options['duration'])
+                finally:
+                    benchmark.drop_database(alias)
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for kind, summary in results[name].items():
+                self.stdout.write(
+                    f'    {kind}: {summary["rps"]} в с, '
+                    f'p50 {summary["p50_ms"]} мс, '
+                    f'p99 {summary["p99_ms"]} мс, '
+                    f'исходы {summary["statuses"]}')
+        if options['output']:
+            benchmark.dump({
+                'commit': benchmark.current_commit(),
+                'options': {key: options[key] for key in (
+                    'readers', 'writers', 'duration')},
+                'results': results,
+            }, options['output'])
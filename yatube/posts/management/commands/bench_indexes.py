@@ -0,0 +1,129 @@
+import random
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from posts import benchmark
+from posts.models import Comment, Follow, Group, Post, User
+from posts.utils import feed_queryset
+from yatube.settings import POSTS_SHOW
+
+INDEXED_MODELS = (Post, Comment, Follow)
+# SQLite не принимает больше 500 строк в одном INSERT
+BATCH_SIZE = 100
+
+
+class Command(BaseCommand):
+    help = ('Показывает планы и время запросов лент с составными '
+            'индексами и без них. С --seed-posts замер идёт на временной '
+            'базе, без него — на рабочей, только чтением.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed-posts', type=int, default=0,
+                            help='Сколько постов создать во временной базе')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if not options['seed_posts']:
+            self.measure(DEFAULT_DB_ALIAS, options['repeat'])
+            return
+        # bulk_create без сигналов рассинхронизировал бы счётчики, ленты
+        # и поиск рабочей базы
+        with tempfile.TemporaryDirectory() as directory:
+            alias = benchmark.scratch_database('bench_indexes', directory)
+            try:
+                self.seed(alias, options['seed_posts'])
+                self.measure(alias, options['repeat'])
+            finally:
+                benchmark.drop_database(alias)
+
+    def measure(self, alias, repeat):
+        queries = self.feed_queries(alias)
+        if not queries:
+            self.stderr.write('Нет данных: запустите с --seed-posts')
+            return
+        # удаление индексов откатывается вместе с транзакцией
+        with transaction.atomic(using=alias):
+            self.stdout.write(self.style.MIGRATE_HEADING('Без индексов'))
+            with connections[alias].cursor() as cursor:
+                for model in INDEXED_MODELS:
+                    for index in model._meta.indexes:
+                        cursor.execute(f'DROP INDEX "{index.name}"')
+            self.report(alias, queries, repeat)
+            transaction.set_rollback(True, using=alias)
+        self.stdout.write(self.style.MIGRATE_HEADING('С индексами'))
+        self.report(alias, queries, repeat)
+
+    def seed(self, alias, posts_count):
+        authors = User.objects.using(alias).bulk_create(
+            [User(username=f'bench_{time.time_ns()}_{i}')
+             for i in range(max(posts_count // 100, 2))])
+        authors = list(User.objects.using(alias).filter(
+            username__in=[author.username for author in authors]))
+        groups = Group.objects.using(alias).bulk_create(
+            [Group(title=f'Группа {i}', slug=f'bench-{time.time_ns()}-{i}')
+             for i in range(10)])
+        groups = list(Group.objects.using(alias).filter(
+            slug__in=[group.slug for group in groups]))
+        Post.objects.using(alias).bulk_create(
+            [Post(text=f'Пост {i}', author=random.choice(authors),
+                  group=random.choice(groups + [None]))
+             for i in range(posts_count)],
+            batch_size=BATCH_SIZE,
+        )
+        posts = list(Post.objects.using(alias).order_by('-id').values_list(
+            'id', flat=True)[:posts_count])
+        Comment.objects.using(alias).bulk_create(
+            [Comment(post_id=random.choice(posts),
+                     author=random.choice(authors), text='Комментарий')
+             for _ in range(posts_count)],
+            batch_size=BATCH_SIZE,
+        )
+        Follow.objects.using(alias).bulk_create(
+            [Follow(user=user, author=author)
+             for user in authors for author in random.sample(
+                 authors, min(10, len(authors))) if user != author],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+    def feed_queries(self, alias):
+        posts = Post.objects.using(alias)
+        post = posts.exclude(group=None).order_by('-id').first()
+        if post is None:
+            return {}
+        ordered = ('-pub_date', '-id')
+        return {
+            'index': feed_queryset(posts.all()).order_by(*ordered),
+            'group_posts': feed_queryset(
+                posts.filter(group_id=post.group_id)
+            ).order_by(*ordered),
+            'profile': feed_queryset(
+                posts.filter(author_id=post.author_id)
+            ).order_by(*ordered),
+            'comments': Comment.objects.using(alias).filter(
+                post=post).order_by('created'),
+            'followers': Follow.objects.using(alias).filter(
+                author_id=post.author_id).values('user_id'),
+        }
+
+    def report(self, alias, queries, repeat):
+        for name, queryset in queries.items():
+            sql, params = queryset[:POSTS_SHOW + 1].query.get_compiler(
+                alias).as_sql()
+            with connections[alias].cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plan = [row[-1] for row in cursor.fetchall()]
+                timings = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    cursor.execute(sql, params)
+                    cursor.fetchall()
+                    timings.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(
+                f'{name}: {statistics.median(timings):.3f} мс')
+            for step in plan:
+                self.stdout.write(f'    {step}')
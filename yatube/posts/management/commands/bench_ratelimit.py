@@ -0,0 +1,54 @@
+import tempfile
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.urls import resolve
+
+from core.middleware import RateLimitMiddleware
+from core.ratelimit import TokenBucket
+from yatube.settings import CACHE_BACKENDS
+
+from .bench_cache import make_cache, timed
+
+
+def middleware_overhead(repeat):
+    """Проверка middleware на маршруте без лимита, мкс."""
+    middleware = RateLimitMiddleware(lambda request: None)
+    request = RequestFactory().get('/')
+    request.resolver_match = resolve('/')
+    return timed(lambda i: middleware.process_view(request, None, (), {}),
+                 repeat)
+
+
+def bucket_overhead(cache, repeat):
+    """Медианы take для пропущенного и отклонённого запроса, мкс."""
+    cache.clear()
+    allowed = TokenBucket('allowed', repeat * 2, 60, cache)
+    denied = TokenBucket('denied', 1, 3600, cache)
+    denied.take('client')
+    return {
+        'allowed': timed(lambda i: allowed.take(f'client{i % 10}'), repeat),
+        'denied': timed(lambda i: denied.take('client'), repeat),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Замеряет цену ограничения частоты запросов: проверку ведра '
+            'токенов на каждом бэкенде кеша и проход middleware.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', nargs='+', choices=CACHE_BACKENDS,
+                            default=list(CACHE_BACKENDS))
+        parser.add_argument('--repeat', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'маршрут без лимита: '
+            f'{middleware_overhead(options["repeat"]):.1f} мкс')
+        for name in options['backend']:
+            with tempfile.TemporaryDirectory() as directory:
+                timings = bucket_overhead(make_cache(name, directory),
+                                          options['repeat'])
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for outcome, median in timings.items():
+                self.stdout.write(f'    {outcome}: {median:.1f} мкс')
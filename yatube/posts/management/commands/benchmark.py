@@ -0,0 +1,59 @@
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Засевает синтетические данные и замеряет пропускную '
+            'способность и p50/p99 всех маршрутов posts. Засев и замер '
+            'идут во временной базе: рабочая не меняется.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-seed', action='store_true',
+                            help='Мерить на копии рабочей базы')
+        for name, default in benchmark.VOLUMES.items():
+            parser.add_argument(f'--{name}', type=int, default=default)
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Зерно генератора данных')
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--transport', nargs='+',
+                            choices=benchmark.TRANSPORTS,
+                            default=list(benchmark.TRANSPORTS))
+        parser.add_argument('--output', help='Куда сохранить JSON')
+        parser.add_argument('--compare',
+                            help='JSON прошлого прогона для сравнения')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            with benchmark.scratch_default(directory, options['no_seed']):
+                if not options['no_seed']:
+                    benchmark.seed(
+                        *(options[name] for name in benchmark.VOLUMES),
+                        seed=options['seed'], prefix=options['prefix'],
+                    )
+                result = benchmark.run(options['transport'],
+                                       options['repeat'])
+        if result is None:
+            raise CommandError('Нет постов с группой: нечего мерить')
+        for transport, routes in result['results'].items():
+            self.stdout.write(self.style.MIGRATE_HEADING(transport))
+            for name, summary in routes.items():
+                self.stdout.write(
+                    f'{name}: {summary["rps"]} rps, '
+                    f'p50 {summary["p50_ms"]} мс, '
+                    f'p99 {summary["p99_ms"]} мс, '
+                    f'статусы {summary["statuses"]}')
+        if options['compare']:
+            previous = benchmark.load(options['compare'])
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'p50 относительно {previous.get("commit")}'))
+            for name, ratio in benchmark.compare(previous, result).items():
+                style = (self.style.ERROR if ratio > 1.1
+                         else self.style.SUCCESS)
+                self.stdout.write(style(f'{name}: x{ratio}'))
+        if options['output']:
+            benchmark.dump(result, options['output'])
+            self.stdout.write(f'Результаты записаны в {options["output"]}')
@@ -0,0 +1,45 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from posts import snapshots
+
+
+def build(target):
+    kind, ident = target
+    try:
+        return snapshots.build(kind, ident), None
+    except Exception as error:
+        return 0, f'{kind} {ident}: {error}'
+
+
+class Command(BaseCommand):
+    help = ('Собирает статические копии первых страниц групп '
+            'и популярных профилей')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Число процессов, по умолчанию по ядрам; '
+                                 '1 — без дочерних процессов')
+
+    def handle(self, *args, **options):
+        if not snapshots.shared_cache():
+            raise CommandError(
+                'Нужен общий кеш (CACHE_BACKEND shared или tiered): '
+                'версии копий из locmem веб-процессы не узнают')
+        targets = snapshots.targets()
+        removed = snapshots.prune(targets)
+        if options['workers'] == 1:
+            results = list(map(build, targets))
+        else:
+            # соединения с базой не должны переходить в дочерние процессы
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+                results = list(pool.map(build, targets))
+        errors = [error for _, error in results if error]
+        for error in errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'Копий страниц: {sum(pages for pages, _ in results)}, '
+            f'удалено устаревших копий: {removed}, ошибок: {len(errors)}'))
@@ -0,0 +1,43 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.importer import IMPORTERS
+from yatube.settings import IMPORT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = ('Загружает посты, комментарии или подписки из NDJSON в формате '
+            'команды export. Авторы и группы должны уже существовать.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=IMPORTERS)
+        parser.add_argument('path', help='Файл NDJSON или - для stdin')
+        parser.add_argument('--batch-size', type=int,
+                            default=IMPORT_BATCH_SIZE)
+        parser.add_argument('--skip-rebuild', action='store_true',
+                            help='Не пересобирать счётчики, ленты и '
+                                 'поиск: для загрузки по частям')
+
+    def handle(self, *args, **options):
+        importer = IMPORTERS[options['kind']](options['batch_size'])
+        start = time.perf_counter()
+        if options['path'] == '-':
+            importer.load(sys.stdin)
+        else:
+            with open(options['path'], encoding='utf-8') as lines:
+                importer.load(lines)
+        elapsed = time.perf_counter() - start
+        for number, error in importer.errors:
+            self.stderr.write(f'строка {number}: {error}')
+        self.stdout.write(
+            f'Принято {importer.accepted} строк за {elapsed:.1f} с '
+            f'({importer.accepted / max(elapsed, 1e-9):.0f} строк/с), '
+            f'пропущено {len(importer.errors)}, '
+            f'уже загружено {importer.duplicates}')
+        if not options['skip_rebuild']:
+            start = time.perf_counter()
+            importer.finish()
+            self.stdout.write(f'Производные данные пересобраны за '
+                              f'{time.perf_counter() - start:.1f} с')
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import (EXPORTS, FORMATS, encode, parse_watermark,
+                          render, rows)
+
+
+class Command(BaseCommand):
+    help = ('Потоково выгружает посты, комментарии или подписки в NDJSON '
+            'или CSV. Водяной знак последней строки печатается в stderr '
+            'для следующей выгрузки с --since.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=EXPORTS)
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--since',
+                            help='Выгрузить только строки новее: дата '
+                                 'ISO 8601, для подписок — id')
+        parser.add_argument('--output', help='Файл; по умолчанию stdout')
+
+    def handle(self, *args, **options):
+        kind = options['kind']
+        since = None
+        if options['since']:
+            try:
+                since = parse_watermark(kind, options['since'])
+            except ValueError:
+                raise CommandError(
+                    f'Неверный водяной знак: {options["since"]}')
+        watermark = EXPORTS[kind].watermark
+        last = {}
+
+        def tracked():
+            for record in rows(kind, since):
+                last['value'] = record[watermark]
+                yield record
+
+        chunks = render(kind, tracked(), options['format'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8',
+                      newline='') as output:
+                output.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+        if 'value' in last:
+            self.stderr.write(f'--since {encode(last["value"])}')
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.writebehind import queue
+from yatube.settings import COMMENT_FLUSH_BATCH, COMMENT_FLUSH_INTERVAL
+
+
+class Command(BaseCommand):
+    help = ('Переносит комментарии из очереди отложенной записи в базу '
+            'пачками. Без --once работает как воркер.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Разобрать очередь и выйти')
+        parser.add_argument('--batch-size', type=int,
+                            default=COMMENT_FLUSH_BATCH)
+        parser.add_argument('--interval', type=float,
+                            default=COMMENT_FLUSH_INTERVAL,
+                            help='Пауза при пустой очереди, с')
+
+    def handle(self, *args, **options):
+        while True:
+            flushed = queue.flush(options['batch_size'])
+            if flushed:
+                self.stdout.write(f'сохранено комментариев: {flushed}')
+            if flushed < options['batch_size']:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
@@ -0,0 +1,41 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.models import Post
+from posts.thumbnails import pregenerate
+
+
+def warm(image_name):
+    try:
+        pregenerate(image_name)
+    except Exception as error:
+        return f'{image_name}: {error}'
+    return None
+
+
+class Command(BaseCommand):
+    help = 'Заранее готовит миниатюры картинок всех постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Число процессов, по умолчанию по ядрам')
+        parser.add_argument('--chunk-size', type=int, default=50)
+
+    def handle(self, *args, **options):
+        images = list(Post.objects.exclude(image='').values_list(
+            'image', flat=True).order_by().distinct())
+        # соединения с базой не должны переходить в дочерние процессы
+        connections.close_all()
+        errors = []
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            for error in pool.map(warm, images,
+                                  chunksize=options['chunk_size']):
+                if error:
+                    errors.append(error)
+        for error in errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюры готовы: {len(images) - len(errors)}, '
+            f'ошибок: {len(errors)}'))
@@ -0,0 +1,70 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from yatube.settings import FANOUT_MAX_FOLLOWERS, TIMELINE_BACKFILL_LIMIT
+
+
+def fill_timelines(apps, schema_editor):
+    """Раскладывает свежие посты авторов, как backfill при подписке:
+    не больше TIMELINE_BACKFILL_LIMIT, популярных авторов — никак."""
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    db_alias = schema_editor.connection.alias
+    follows = Follow.objects.using(db_alias)
+    popular = set(follows.values('author_id').annotate(
+        followers=models.Count('id')).filter(
+            followers__gt=FANOUT_MAX_FOLLOWERS).values_list(
+                'author_id', flat=True))
+    for follow in follows.exclude(author_id__in=popular).iterator():
+        posts = Post.objects.using(db_alias).filter(
+            author_id=follow.author_id).order_by(
+                '-pub_date', '-id').values_list('id', flat=True)
+        TimelineEntry.objects.using(db_alias).bulk_create(
+            [TimelineEntry(user_id=follow.user_id, post_id=post_id)
+             for post_id in posts[:TIMELINE_BACKFILL_LIMIT]],
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0007_follow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+        migrations.AlterModelTable(
+            name='follow',
+            table='posts_follow',
+        ),
+        migrations.AddField(
+            model_name='timelineentry',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post'),
+        ),
+        migrations.AddField(
+            model_name='timelineentry',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_timeline_entry'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Post = apps.get_model('posts', 'Post')
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    PostStats = apps.get_model('posts', 'PostStats')
+    db_alias = schema_editor.connection.alias
+    AuthorStats.objects.using(db_alias).bulk_create(
+        [AuthorStats(user_id=user.pk,
+                     posts_count=user.posts_count,
+                     followers_count=user.followers_count,
+                     following_count=user.following_count)
+         for user in User.objects.using(db_alias).annotate(
+             posts_count=models.Count('posts', distinct=True),
+             followers_count=models.Count('following', distinct=True),
+             following_count=models.Count('follower', distinct=True),
+         ).order_by().iterator()],
+        batch_size=500,
+    )
+    PostStats.objects.using(db_alias).bulk_create(
+        [PostStats(post_id=post.pk, comments_count=post.comments_count)
+         for post in Post.objects.using(db_alias).annotate(
+             comments_count=models.Count('comments')).order_by().iterator()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0008_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PostStats',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='posts.Post')),
+                ('comments_count', models.PositiveIntegerField(default=0, verbose_name='Комментариев')),
+            ],
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+from django.utils import timezone
+
+from yatube.settings import FANOUT_MAX_FOLLOWERS
+
+
+def mark_pulled(apps, schema_editor):
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    db_alias = schema_editor.connection.alias
+    AuthorStats.objects.using(db_alias).filter(
+        followers_count__gt=FANOUT_MAX_FOLLOWERS,
+    ).update(pulled_since=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_timeline_pub_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorstats',
+            name='pulled_since',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Подтягивается при чтении с'),
+        ),
+        migrations.RunPython(mark_pulled, migrations.RunPython.noop),
+    ]
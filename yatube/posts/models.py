@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.contrib.auth import get_user_model
 
 from yatube.settings import FIRST_POST_SYMBOLS
@@ -6,6 +6,24 @@ from yatube.settings import FIRST_POST_SYMBOLS
 User = get_user_model()
 
 
+class CountedModel(models.Model):
+    """Запись, от которой сигналы сдвигают счётчики.
+
+    save() Django шлёт post_save уже после своей транзакции, поэтому
+    сохранение обёрнуто в atomic: счётчик откатится вместе со строкой.
+    delete() шлёт post_delete внутри транзакции удаления и так.
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(
+            type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
+
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=100, unique=True)
@@ -15,7 +33,7 @@ class Group(models.Model):
         return self.title
 
 
-class Post(models.Model):
+class Post(CountedModel):
     text = models.TextField(
         'Текст поста',
         help_text='Введите текст поста'
@@ -49,12 +67,26 @@ class Post(models.Model):
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # порядок полей повторяет ключ постраничного вывода (pub_date, id)
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:FIRST_POST_SYMBOLS]
 
 
-class Comment(models.Model):
+class Comment(CountedModel):
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+        ]
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -73,12 +105,16 @@ class Comment(models.Model):
     )
 
 
-class Follow(models.Model):
+class Follow(CountedModel):
     class Meta:
         db_table = 'posts_follow'
         constraints = [
             models.UniqueConstraint(fields=['user', 'author'],
                                     name='unique_follow')]
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        ]
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -87,3 +123,54 @@ class Follow(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='following')
+
+
+class TimelineEntry(models.Model):
+    """Пост в ленте подписчика, разложенный при публикации.
+
+    Дата поста скопирована сюда: лента листается по индексу
+    (user, pub_date, post) без чтения и сортировки постов.
+    """
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_timeline_entry')]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_pub_date_idx'),
+        ]
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline')
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries')
+    pub_date = models.DateTimeField('Дата публикации поста')
+
+
+class AuthorStats(models.Model):
+    """Счётчики пользователя, которые обновляются вместе с записями."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats')
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+    # с какого момента посты подтягиваются в ленты при чтении,
+    # см. posts.timeline; None — раскладываются при публикации
+    pulled_since = models.DateTimeField(
+        'Подтягивается при чтении с', null=True, blank=True)
+
+
+class PostStats(models.Model):
+    """Счётчики поста, которые обновляются вместе с записями."""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats')
+    comments_count = models.PositiveIntegerField('Комментариев', default=0)
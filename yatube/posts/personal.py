@@ -0,0 +1,83 @@
+import json
+import re
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+
+from .forms import CommentForm
+from .models import Follow
+
+FRAGMENTS = {}
+MARKER = re.compile(r'<!--personal:(\w+):([\w=-]*)-->')
+
+
+def fragment(name):
+    """Регистрирует кусок страницы, который зависит от пользователя."""
+    def decorator(func):
+        FRAGMENTS[name] = func
+        return func
+    return decorator
+
+
+def marker(name, params):
+    """Метка на месте личного куска в общей для всех копии страницы."""
+    packed = urlsafe_b64encode(json.dumps(params).encode()).decode()
+    return f'<!--personal:{name}:{packed}-->'
+
+
+def render_fragment(request, name, params):
+    return FRAGMENTS[name](request, **params)
+
+
+def splice(request, response):
+    """Подставляет личные куски пользователя на место меток."""
+    def replace(match):
+        params = json.loads(urlsafe_b64decode(match.group(2).encode()))
+        return render_fragment(request, match.group(1), params)
+
+    content = MARKER.sub(replace, response.content.decode(response.charset))
+    # ответ из кеша общий для всех запросов процесса: меняется только копия
+    spliced = HttpResponse(content, status=response.status_code,
+                           content_type=response['Content-Type'])
+    for header, value in response.items():
+        spliced[header] = value
+    return spliced
+
+
+@fragment('user_nav')
+def user_nav(request):
+    return render_to_string('includes/user_nav.html', request=request)
+
+
+@fragment('switcher')
+def switcher(request, **tabs):
+    return render_to_string(
+        'posts/includes/switcher.html', tabs, request=request)
+
+
+@fragment('follow_button')
+def follow_button(request, username):
+    following = (
+        request.user.is_authenticated
+        and Follow.objects.filter(user=request.user,
+                                  author__username=username).exists()
+    )
+    context = {'username': username, 'following': following}
+    return render_to_string(
+        'posts/includes/follow_button.html', context, request=request)
+
+
+@fragment('edit_link')
+def edit_link(request, post_id, author_id):
+    context = {'post_id': post_id,
+               'is_author': request.user.pk == author_id}
+    return render_to_string(
+        'posts/includes/edit_link.html', context, request=request)
+
+
+@fragment('comment_form')
+def comment_form(request, post_id):
+    context = {'post_id': post_id, 'form': CommentForm()}
+    return render_to_string(
+        'posts/includes/comment_form.html', context, request=request)
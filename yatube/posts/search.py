@@ -0,0 +1,166 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from django.db import connection
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+
+from yatube.settings import POSTS_SHOW, SEARCH_BACKEND
+
+from .models import Post
+from .utils import KeysetPaginator, feed_queryset
+
+SearchHit = namedtuple('SearchHit', ('post_id', 'rank', 'snippet'))
+# границы подсветки: не встречаются в тексте и переживают escape()
+MARK_START, MARK_END = '\x02', '\x03'
+
+
+def highlight(snippet):
+    """Экранирует фрагмент и заменяет границы совпадений на <mark>."""
+    return mark_safe(escape(snippet).replace(
+        MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+class SearchBackend:
+    """Поисковый индекс постов.
+
+    search() возвращает SearchHit по возрастанию (rank, post_id) —
+    или по убыванию при backward=True — строго за ключом key.
+    """
+
+    def index(self, post):
+        raise NotImplementedError
+
+    def remove(self, post_id):
+        raise NotImplementedError
+
+    def rebuild(self):
+        raise NotImplementedError
+
+    def search(self, query, key=None, backward=False, limit=POSTS_SHOW):
+        raise NotImplementedError
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """Индекс в виртуальной таблице SQLite FTS5 с ранжированием bm25."""
+    table = 'posts_post_fts'
+
+    def index(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {self.table}(rowid, text) '
+                'VALUES (%s, %s)', [post.pk, post.text])
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid = %s', [post_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table}(rowid, text) '
+                'SELECT id, text FROM posts_post')
+
+    def match_expression(self, query):
+        # каждое слово ищется как префикс, синтаксис FTS5 из запроса не
+        # пропускается
+        terms = re.findall(r'\w+', query)
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def search(self, query, key=None, backward=False, limit=POSTS_SHOW):
+        expression = self.match_expression(query)
+        if not expression:
+            return []
+        rank = f'bm25({self.table})'
+        sql = [
+            f'SELECT rowid, {rank}, snippet({self.table}, 0, '
+            f"'{MARK_START}', '{MARK_END}', '…', 16) "
+            f'FROM {self.table} WHERE {self.table} MATCH %s'
+        ]
+        params = [expression]
+        compare, order = ('<', 'DESC') if backward else ('>', 'ASC')
+        if key is not None:
+            sql.append(f'AND ({rank} {compare} %s '
+                       f'OR ({rank} = %s AND rowid {compare} %s))')
+            params += [key[0], key[0], key[1]]
+        sql.append(f'ORDER BY {rank} {order}, rowid {order} LIMIT %s')
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(' '.join(sql), params)
+            return [SearchHit(*row) for row in cursor.fetchall()]
+
+
+class ContainsBackend(SearchBackend):
+    """Запасной поиск через icontains для баз без FTS5; без ранжирования."""
+
+    def index(self, post):
+        pass
+
+    def remove(self, post_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, query, key=None, backward=False, limit=POSTS_SHOW):
+        query = query.strip()
+        if not query:
+            return []
+        posts = Post.objects.filter(text__icontains=query)
+        # rank = -id: свежие посты первыми, ключ совпадает с FTS5
+        if key is not None:
+            if backward:
+                posts = posts.filter(id__gt=key[1])
+            else:
+                posts = posts.filter(id__lt=key[1])
+        posts = posts.order_by('id' if backward else '-id')
+        pattern = re.compile(re.escape(query), re.IGNORECASE)
+        return [
+            SearchHit(post_id, -post_id, pattern.sub(
+                lambda match: MARK_START + match.group() + MARK_END, text))
+            for post_id, text in posts.values_list('id', 'text')[:limit]
+        ]
+
+
+@lru_cache()
+def get_backend():
+    return import_string(SEARCH_BACKEND)()
+
+
+class SearchPaginator(KeysetPaginator):
+    """Результаты поиска по ключу (rank, id)."""
+
+    def __init__(self, query, per_page, backend=None):
+        super().__init__([], per_page)
+        self.query = query
+        self.backend = backend or get_backend()
+
+    def parse_value(self, value):
+        return float(value)
+
+    def row_key(self, post):
+        return repr(post.search_rank), post.id
+
+    def fetch(self, key, backward):
+        hits = self.backend.search(self.query, key, backward,
+                                   self.per_page + 1)
+        posts = feed_queryset(
+            Post.objects.filter(id__in=[hit.post_id for hit in hits]))
+        posts = {post.id: post for post in posts}
+        rows = []
+        for hit in hits:
+            post = posts.get(hit.post_id)
+            if post is not None:
+                post.search_rank = hit.rank
+                post.snippet = highlight(hit.snippet)
+                rows.append(post)
+        return rows
+
+
+def search_arrange(request, query):
+    paginator = SearchPaginator(query, POSTS_SHOW)
+    return paginator.get_page(request.GET.get('cursor'))
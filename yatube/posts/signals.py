@@ -0,0 +1,130 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import (AuthorStats, Comment, Follow, Group, Post, PostStats,
+                     User)
+from . import caching, counters, timeline
+from .search import get_backend
+
+
+@receiver(post_save, sender=User)
+def create_author_stats(sender, instance, created, **kwargs):
+    if created:
+        AuthorStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, **kwargs):
+    if created:
+        PostStats.objects.get_or_create(post=instance)
+        counters.change(AuthorStats, instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    counters.change(AuthorStats, instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change(PostStats, instance.post_id, 'comments_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    counters.change(PostStats, instance.post_id, 'comments_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.change(AuthorStats, instance.author_id, 'followers_count', 1)
+        counters.change(AuthorStats, instance.user_id, 'following_count', 1)
+        timeline.switch_to_pull([instance.author_id])
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    counters.change(AuthorStats, instance.author_id, 'followers_count', -1)
+    counters.change(AuthorStats, instance.user_id, 'following_count', -1)
+    timeline.switch_to_fan_out([instance.author_id])
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance.user, instance.author)
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_group(sender, instance, **kwargs):
+    instance._old_group_id = None
+    if instance.pk:
+        instance._old_group_id = Post.objects.filter(
+            pk=instance.pk).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post(sender, instance, **kwargs):
+    caching.bump(caching.FEED)
+    caching.bump(caching.POST, instance.pk)
+    caching.bump(caching.AUTHOR, instance.author.username)
+    group_ids = {instance.group_id, getattr(instance, '_old_group_id', None)}
+    for slug in Group.objects.filter(
+            id__in=group_ids).values_list('slug', flat=True):
+        caching.bump(caching.GROUP, slug)
+    # post_delete не передаёт created
+    if 'created' in kwargs:
+        cache.set(caching.owner_key(instance.pk), (
+            instance.author.username,
+            instance.group.slug if instance.group_id else None), None)
+    else:
+        cache.delete(caching.owner_key(instance.pk))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment(sender, instance, **kwargs):
+    caching.bump(caching.POST, instance.post_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow(sender, instance, **kwargs):
+    # у автора меняется число подписчиков, у читателя — подписок
+    caching.bump(caching.AUTHOR, instance.author.username)
+    caching.bump(caching.AUTHOR, instance.user.username)
+    caching.bump(caching.FOLLOWER, instance.user_id)
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group(sender, instance, **kwargs):
+    caching.bump(caching.GROUP, instance.slug)
+    caching.bump(caching.FEED)
+    # slug мог смениться: владельцы постов перечитаются из базы
+    cache.delete_many([caching.owner_key(pk) for pk in
+                       instance.posts.values_list('pk', flat=True)])
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    get_backend().index(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    get_backend().remove(instance.pk)
@@ -0,0 +1,223 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+from functools import wraps
+
+from django.contrib.auth.models import AnonymousUser
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import reverse
+
+from core.deferred import after_response
+from yatube.settings import (POSTS_SHOW, SNAPSHOT_PAGES, SNAPSHOT_PROFILES,
+                             SNAPSHOT_ROOT, SNAPSHOTS)
+
+from .caching import AUTHOR, GROUP, get_versions
+from .models import Follow, Group, Post, User
+from .personal import splice
+from .utils import CursorPaginator, feed_queryset
+
+Target = namedtuple('Target', 'url_name kwarg scope posts')
+
+TARGETS = {
+    'group': Target('posts:group_list', 'slug', GROUP,
+                    lambda slug: Post.objects.filter(group__slug=slug)),
+    'profile': Target('posts:profile', 'username', AUTHOR,
+                      lambda username: Post.objects.filter(
+                          author__username=username)),
+}
+# view без обёрток кеша: копия собирается с метками {% personal %}
+VIEWS = {}
+
+
+def directory(kind, ident):
+    # slug и имя могут быть не латиницей, поэтому каталог — хеш
+    name = hashlib.md5(str(ident).encode()).hexdigest()
+    return os.path.join(SNAPSHOT_ROOT, kind, name)
+
+
+def file_name(full_path):
+    return hashlib.md5(full_path.encode()).hexdigest() + '.html'
+
+
+def versions(kind, ident):
+    return get_versions([(TARGETS[kind].scope, ident)])
+
+
+def shared_cache():
+    """Версии видны всем процессам: иначе копия, собранная командой
+    или другим воркером, несёт версию, которую веб-процесс не узнает."""
+    return not isinstance(caches['default'], LocMemCache)
+
+
+@checks.register()
+def check_cache(app_configs, **kwargs):
+    if SNAPSHOTS and not shared_cache():
+        return [checks.Error(
+            'SNAPSHOTS требует общего кеша: версии копий в locmem свои '
+            'у каждого процесса',
+            hint="CACHE_BACKEND = 'shared' или 'tiered'",
+            id='posts.E001',
+        )]
+    return []
+
+
+def read(kind, ident, full_path):
+    """Копия страницы, если она собрана для текущей версии данных."""
+    path = os.path.join(directory(kind, ident), file_name(full_path))
+    try:
+        with open(path, 'rb') as snapshot:
+            version = snapshot.readline().decode().strip()
+            content = snapshot.read()
+    except FileNotFoundError:
+        return None
+    if version != versions(kind, ident):
+        return None
+    return content
+
+
+def write(folder, full_path, version, content):
+    # запись через переименование: читатель не увидит половину файла
+    handle, temporary = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    with os.fdopen(handle, 'wb') as snapshot:
+        snapshot.write(f'{version}\n'.encode())
+        snapshot.write(content)
+    name = file_name(full_path)
+    os.replace(temporary, os.path.join(folder, name))
+    return name
+
+
+def render_page(kind, ident, full_path, version):
+    request = RequestFactory().get(full_path)
+    request.user = AnonymousUser()
+    request.splice_personal = True
+    # версия в ключах {% cache %}: иначе фрагмент из прошлой сборки
+    # попадёт в копию под новой версией
+    request.cache_version = version
+    return VIEWS[kind](request, **{TARGETS[kind].kwarg: ident})
+
+
+def build(kind, ident):
+    """Собирает первые SNAPSHOT_PAGES страниц; возвращает число файлов.
+
+    Версия берётся до рендера: если данные изменятся во время сборки,
+    копия выйдет старой версии и отдаваться не будет. Файлы прошлых
+    сборок с устаревшими курсорами удаляются.
+    """
+    target = TARGETS[kind]
+    version = versions(kind, ident)
+    path = reverse(target.url_name, kwargs={target.kwarg: ident})
+    paginator = CursorPaginator(feed_queryset(target.posts(ident)),
+                                POSTS_SHOW)
+    folder = directory(kind, ident)
+    os.makedirs(folder, exist_ok=True)
+    written, cursor = set(), None
+    for _ in range(SNAPSHOT_PAGES):
+        full_path = f'{path}?cursor={cursor}' if cursor else path
+        response = render_page(kind, ident, full_path, version)
+        if response.status_code != 200:
+            break
+        written.add(write(folder, full_path, version, response.content))
+        # курсор следующей страницы из той же выборки, что у view
+        cursor = paginator.get_page(cursor).next_cursor
+        if cursor is None:
+            break
+    for name in os.listdir(folder):
+        if name not in written:
+            os.remove(os.path.join(folder, name))
+    if not written:
+        os.rmdir(folder)
+    return len(written)
+
+
+def targets():
+    """Все группы и SNAPSHOT_PROFILES авторов с наибольшим числом
+    подписчиков."""
+    groups = Group.objects.values_list('slug', flat=True).order_by('id')
+    authors = User.objects.order_by(
+        '-stats__followers_count', 'id'
+    ).values_list('username', flat=True)[:SNAPSHOT_PROFILES]
+    return ([('group', slug) for slug in groups]
+            + [('profile', username) for username in authors])
+
+
+def prune(keep):
+    """Удаляет копии, не входящие в keep: например, авторов, которые
+    выпали из самых популярных."""
+    keep = {directory(kind, ident) for kind, ident in keep}
+    removed = 0
+    for kind in TARGETS:
+        root = os.path.join(SNAPSHOT_ROOT, kind)
+        for name in os.listdir(root) if os.path.isdir(root) else ():
+            folder = os.path.join(root, name)
+            if folder not in keep:
+                shutil.rmtree(folder)
+                removed += 1
+    return removed
+
+
+def snapshot(kind):
+    """Отдаёт страницу из собранной копии, иначе вызывает сам view.
+
+    Копия хранится с метками {% personal %}: под cache_versioned_page
+    она ложится в кеш как есть, иначе куски подставляются здесь.
+    """
+    target = TARGETS[kind]
+
+    def decorator(view_func):
+        VIEWS[kind] = view_func
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if SNAPSHOTS and request.method in ('GET', 'HEAD'):
+                content = read(kind, kwargs[target.kwarg],
+                               request.get_full_path())
+                if content is not None:
+                    response = HttpResponse(content)
+                    if getattr(request, 'splice_personal', False):
+                        return response
+                    return splice(request, response)
+            return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def schedule(kind, ident):
+    """Откладывает пересборку уже собранной копии до конца запроса, см.
+    core.deferred. Копии, которых нет, не собираются: их делает
+    команда build_snapshots."""
+    if not SNAPSHOTS or not os.path.isdir(directory(kind, ident)):
+        return
+    after_response(build, kind, ident)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def rebuild_post(sender, instance, **kwargs):
+    if not SNAPSHOTS:
+        return
+    schedule('profile', instance.author.username)
+    group_ids = {instance.group_id, getattr(instance, '_old_group_id', None)}
+    for slug in Group.objects.filter(
+            id__in=group_ids).values_list('slug', flat=True):
+        schedule('group', slug)
+
+
+@receiver(post_save, sender=Group)
+def rebuild_group(sender, instance, **kwargs):
+    schedule('group', instance.slug)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def rebuild_follow(sender, instance, **kwargs):
+    # в профиле выводятся числа подписчиков и подписок
+    schedule('profile', instance.author.username)
+    schedule('profile', instance.user.username)
@@ -0,0 +1,46 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+from django.templatetags.cache import CacheNode, do_cache
+
+from posts.caching import get_or_compute
+
+register = template.Library()
+
+
+class VersionedCacheNode(CacheNode):
+    """{% cache %} с версией данных страницы и защитой от наплыва.
+
+    К ключу добавляется cache_version из контекста, а старая копия
+    фрагмента без версии отдаётся, пока один запрос пересобирает новую.
+    Кешируется только общая копия с метками {% personal %}: вне
+    cache_versioned_page фрагмент с кусками пользователя рендерится
+    заново.
+    """
+
+    def render(self, context):
+        request = context.get('request')
+        if not getattr(request, 'splice_personal', False):
+            return self.nodelist.render(context)
+        timeout = self.expire_time_var.resolve(context)
+        if not isinstance(timeout, int):
+            raise template.TemplateSyntaxError(
+                f'"cache" tag got a non-integer timeout value: {timeout!r}')
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        version = context.get('cache_version', '')
+        return get_or_compute(
+            make_template_fragment_key(self.fragment_name,
+                                       vary_on + [version]),
+            lambda: self.nodelist.render(context),
+            timeout,
+            stale_key=make_template_fragment_key(self.fragment_name,
+                                                 vary_on),
+        )
+
+
+@register.tag('cache')
+def do_versioned_cache(parser, token):
+    """Тот же синтаксис, что у {% cache %} из django.templatetags.cache."""
+    node = do_cache(parser, token)
+    return VersionedCacheNode(node.nodelist, node.expire_time_var,
+                              node.fragment_name, node.vary_on,
+                              node.cache_name)
@@ -0,0 +1,19 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts.personal import marker, render_fragment
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def personal(context, name, **params):
+    """Выводит личный кусок страницы или метку для него.
+
+    Внутри кешируемой страницы ставится метка: общая копия хранится
+    в кеше одна на всех, а кусок пользователя подставляется при ответе.
+    """
+    request = context['request']
+    if getattr(request, 'splice_personal', False):
+        return mark_safe(marker(name, params))
+    return mark_safe(render_fragment(request, name, params))
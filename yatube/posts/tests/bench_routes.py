@@ -0,0 +1,40 @@
+"""Замеры маршрутов под pytest.
+
+Не входят в обычный прогон тестов; запуск:
+    pytest yatube/posts/tests/bench_routes.py -m benchmark
+Путь для JSON с результатами задаёт BENCHMARK_OUTPUT.
+"""
+import os
+
+import pytest
+
+from posts import benchmark
+
+VOLUMES = {
+    'users': 20,
+    'groups': 3,
+    'posts': 200,
+    'comments': 200,
+    'follows': 60,
+}
+REPEAT = 10
+
+
+@pytest.fixture
+def seeded(transactional_db):
+    benchmark.seed(**VOLUMES)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('transport', benchmark.TRANSPORTS)
+def test_routes(seeded, transport):
+    result = benchmark.run([transport], REPEAT)
+    routes = result['results'][transport]
+    assert set(routes) == {name for name, _ in benchmark.route_urls()[1]}
+    for name, summary in routes.items():
+        assert summary['requests'] == REPEAT
+        assert summary['p50_ms'] <= summary['p99_ms']
+        assert all(status < 500 for status in summary['statuses']), name
+    output = os.environ.get('BENCHMARK_OUTPUT')
+    if output:
+        benchmark.dump(result, f'{output}.{transport}.json')
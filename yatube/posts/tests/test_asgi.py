@@ -0,0 +1,133 @@
+import asyncio
+import threading
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.signals import request_finished, request_started
+from django.http import HttpResponse
+from django.test import TransactionTestCase
+
+from core import deferred
+from core.asgi import AsgiHandler
+from posts.models import Post
+
+User = get_user_model()
+
+
+class AsgiHandlerTests(TransactionTestCase):
+    """Запросы идут в потоках пула, поэтому данные должны быть в базе."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        Post.objects.create(text='Тестовый текст', author=self.author)
+        self.app = AsgiHandler(threads=2)
+
+    def tearDown(self):
+        self.app.executor.shutdown()
+
+    def request(self, path, query=b'', events=None):
+        scope = {
+            'type': 'http',
+            'method': 'GET',
+            'path': path,
+            'query_string': query,
+            'headers': [(b'host', b'127.0.0.1')],
+            'server': ('127.0.0.1', 80),
+        }
+        sent = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            sent.append(message)
+            if events is not None:
+                events.append(message['type'])
+
+        asyncio.run(self.app(scope, receive, send))
+        return sent[0], b''.join(message.get('body', b'')
+                                 for message in sent[1:])
+
+    def test_feed_through_asgi(self):
+        '''Лента отдаётся через ASGI с заголовками Django'''
+        start, body = self.request('/')
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/html; charset=utf-8'),
+                      start['headers'])
+        self.assertIn('Тестовый текст', body.decode())
+
+    def test_query_and_not_found(self):
+        '''Параметры запроса доходят до view, 404 отдаётся как есть'''
+        start, body = self.request('/search/', 'q=Тестовый'.encode())
+        self.assertEqual(start['status'], 200)
+        self.assertIn('Тестовый', body.decode())
+        start, _ = self.request('/profile/nobody/')
+        self.assertEqual(start['status'], 404)
+
+    def test_stream_on_one_thread(self):
+        '''Куски потокового ответа читаются и закрываются в одном потоке'''
+        threads = []
+
+        class Stream:
+            streaming = True
+
+            def __iter__(self):
+                for number in range(5):
+                    threads.append(threading.current_thread())
+                    yield str(number).encode()
+
+            def close(self):
+                threads.append(threading.current_thread())
+
+        def handler(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return Stream()
+
+        self.app.handler = handler
+        start, body = self.request('/export/')
+        self.assertEqual(body, b'01234')
+        self.assertEqual(len(threads), 6)
+        self.assertEqual(len(set(threads)), 1)
+        # не поток пула, который тем временем обслуживает другие запросы
+        self.assertTrue(threads[0].name.startswith('asgi-stream'))
+
+    def test_close_after_send(self):
+        '''request_finished и задачи после ответа идут после отправки'''
+        events = []
+
+        def finished(**kwargs):
+            events.append('request_finished')
+        request_finished.connect(finished)
+        self.addCleanup(request_finished.disconnect, finished)
+
+        def handler(environ, start_response):
+            request_started.send(sender=None)
+            deferred.after_response(events.append, 'task')
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return HttpResponse(b'ok')
+
+        self.app.handler = handler
+        for _ in range(3):
+            events.clear()
+            self.request('/', events=events)
+            deferred.drain()
+            self.assertEqual(events[:2], ['http.response.start',
+                                          'http.response.body'])
+            self.assertCountEqual(events[2:], ['request_finished', 'task'])
+
+    def test_lifespan(self):
+        '''Сервер получает подтверждение запуска и остановки'''
+        messages = iter([{'type': 'lifespan.startup'},
+                         {'type': 'lifespan.shutdown'}])
+        sent = []
+
+        async def receive():
+            return next(messages)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        asyncio.run(self.app({'type': 'lifespan'}, receive, send))
+        self.assertEqual(sent, ['lifespan.startup.complete',
+                                'lifespan.shutdown.complete'])
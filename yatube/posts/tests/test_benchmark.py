@@ -0,0 +1,64 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+
+from posts import benchmark
+from posts.models import AuthorStats, Comment, Follow, Group, Post, User
+
+
+class SeedTests(TestCase):
+    def test_seed_volumes(self):
+        '''Засев создаёт заданные объёмы и пересобирает счётчики'''
+        benchmark.seed(users=5, groups=2, posts=30, comments=10, follows=4)
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(Group.objects.count(), 2)
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertEqual(Comment.objects.count(), 10)
+        self.assertTrue(Follow.objects.exists())
+        self.assertEqual(
+            sum(AuthorStats.objects.values_list('posts_count', flat=True)),
+            30)
+
+    def test_route_urls_cover_posts_urls(self):
+        '''Адреса строятся для каждого маршрута posts'''
+        benchmark.seed(users=3, groups=1, posts=10, comments=0, follows=0)
+        viewer, urls = benchmark.route_urls()
+        self.assertIsNotNone(viewer)
+        self.assertEqual(len(urls), len(benchmark.urlpatterns))
+
+
+class SummaryTests(TestCase):
+    def test_percentiles_and_compare(self):
+        '''Перцентили и сравнение с прошлым прогоном'''
+        summary = benchmark.summarize(list(range(1, 101)), 1.0, {200})
+        self.assertEqual(summary['p50_ms'], 50)
+        self.assertEqual(summary['p99_ms'], 99)
+        previous = {'results': {'client': {'index': {'p50_ms': 25}}}}
+        current = {'results': {'client': {'index': summary}}}
+        self.assertEqual(benchmark.compare(previous, current),
+                         {'client:index': 2.0})
+
+
+class IndexBenchmarkTests(TestCase):
+    def test_seed_goes_to_scratch_database(self):
+        '''Засев замера индексов не трогает рабочую базу'''
+        out = StringIO()
+        call_command('bench_indexes', seed_posts=50, repeat=1, stdout=out)
+        self.assertIn('С индексами', out.getvalue())
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(Post.objects.exists())
+
+
+class BenchmarkCommandTests(TransactionTestCase):
+    """Команда подменяет соединение default: без транзакции TestCase."""
+
+    def test_seed_and_sweep_in_scratch_database(self):
+        '''Засев и прогон маршрутов не пишут в рабочую базу'''
+        out = StringIO()
+        call_command('benchmark', users=3, groups=1, posts=20, comments=2,
+                     follows=2, repeat=1, transport=['client'], stdout=out)
+        self.assertIn('follow_index', out.getvalue())
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(Follow.objects.exists())
@@ -0,0 +1,168 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from core.cache import SQLiteCache, TieredCache
+from posts.personal import marker, splice
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_basic_operations(self):
+        '''Запись, чтение, удаление и чтение пачкой'''
+        self.cache.set('page', {'html': 'текст'})
+        self.assertEqual(self.cache.get('page'), {'html': 'текст'})
+        self.assertEqual(self.cache.get_many(['page', 'missing']),
+                         {'page': {'html': 'текст'}})
+        self.assertTrue(self.cache.has_key('page'))
+        self.assertTrue(self.cache.delete('page'))
+        self.assertIsNone(self.cache.get('page'))
+
+    def test_shared_between_instances(self):
+        '''Другой процесс с тем же файлом видит те же записи'''
+        self.cache.set('page', 'общая')
+        self.assertEqual(self.make_cache().get('page'), 'общая')
+
+    def test_add_and_incr(self):
+        '''add не перезаписывает живую запись, incr атомарно прибавляет'''
+        self.assertTrue(self.cache.add('lock', 1))
+        self.assertFalse(self.make_cache().add('lock', 2))
+        self.assertEqual(self.cache.incr('lock', 5), 6)
+        self.assertEqual(self.make_cache().get('lock'), 6)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_expiration(self):
+        '''Просроченная запись не читается и уступает место add'''
+        self.cache.set('page', 'старая', 1)
+        with mock.patch('core.cache.time.time',
+                        return_value=time.time() + 2):
+            self.assertIsNone(self.cache.get('page'))
+            self.assertTrue(self.cache.add('page', 'новая'))
+        self.assertEqual(self.cache.get('page'), 'новая')
+        self.assertTrue(self.cache.touch('page', None))
+
+    @mock.patch('core.cache.CULL_EVERY', 1)
+    def test_lru_cull_by_entries(self):
+        '''Сверх MAX_ENTRIES удаляются давно не читавшиеся записи'''
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=3)
+        for number in range(3):
+            with mock.patch('core.cache.time.time', return_value=number):
+                cache.set(f'key{number}', number, None)
+        cache.set('key3', 3, None)
+        self.assertIsNone(cache.get('key0'))
+        self.assertEqual(cache.get('key3'), 3)
+
+    @mock.patch('core.cache.CULL_EVERY', 1)
+    def test_get_many_and_incr_refresh_lru(self):
+        '''Чтение пачкой и incr тоже продлевают жизнь записи'''
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=3)
+        for number in range(3):
+            with mock.patch('core.cache.time.time', return_value=number):
+                cache.set(f'key{number}', number, None)
+        with mock.patch('core.cache.time.time', return_value=100):
+            cache.get_many(['key0'])
+            cache.incr('key1')
+        cache.set('key3', 3, None)
+        self.assertIsNone(cache.get('key2'))
+        self.assertEqual(cache.get_many(['key0', 'key1']),
+                         {'key0': 0, 'key1': 2})
+
+    @mock.patch('core.cache.CULL_EVERY', 1)
+    def test_cull_by_bytes(self):
+        '''Суммарный размер значений не превышает MAX_BYTES'''
+        cache = self.make_cache(MAX_BYTES=3000)
+        for number in range(5):
+            cache.set(f'key{number}', b'x' * 1000)
+        size = cache.connection.execute(
+            'SELECT SUM(size) FROM cache').fetchone()[0]
+        self.assertLessEqual(size, 3000)
+        self.assertIsNotNone(cache.get('key4'))
+
+
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.l2 = SQLiteCache(os.path.join(self.directory, 'cache.sqlite3'),
+                              {})
+        self.first = self.make_cache('first')
+        self.second = self.make_cache('second')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, name, **options):
+        # разные LOCATION — как L1 двух процессов над одним L2
+        location = os.path.join(self.directory, name)
+        return TieredCache(location, {'OPTIONS': {'L2': self.l2, **options}})
+
+    def test_read_through_and_stats(self):
+        '''Промах L1 читается из L2 и дальше отдаётся из памяти'''
+        self.first.set('page', 'страница')
+        self.assertEqual(self.second.get('page'), 'страница')
+        self.assertEqual(self.second.get('page'), 'страница')
+        self.assertIsNone(self.second.get('missing'))
+        stats = self.second.stats()
+        self.assertEqual((stats['l1']['hits'], stats['l1']['misses']),
+                         (1, 2))
+        self.assertEqual((stats['l2']['hits'], stats['l2']['misses']),
+                         (1, 1))
+        self.assertEqual(stats['l1']['entries'], 1)
+
+    def test_versions_bypass_l1(self):
+        '''Версии всегда из L2: bump виден всем процессам сразу'''
+        self.first.set('version:post:1', 1, None)
+        self.assertEqual(self.second.get_many(['version:post:1']),
+                         {'version:post:1': 1})
+        self.first.incr('version:post:1')
+        self.assertEqual(self.second.get('version:post:1'), 2)
+        self.assertEqual(self.second.stats()['l1']['entries'], 0)
+
+    @mock.patch('core.cache.EPOCH_CHECK', 0)
+    def test_delete_broadcast(self):
+        '''delete в одном процессе очищает L1 остальных'''
+        self.first.set('page', 'старая')
+        self.assertEqual(self.second.get('page'), 'старая')
+        self.first.delete('page')
+        self.assertIsNone(self.second.get('page'))
+
+    def test_l1_limits(self):
+        '''L1 ограничен по байтам (LRU) и по сроку жизни'''
+        cache = self.make_cache('small', L1_MAX_BYTES=2500)
+        cache.set('first', b'x' * 1000)
+        cache.set('second', b'x' * 1000)
+        cache.get('first')
+        cache.set('third', b'x' * 1000)
+        self.assertEqual(cache.stats()['l1']['entries'], 2)
+        self.assertLessEqual(cache.stats()['l1']['bytes'], 2500)
+        self.assertEqual(cache.get('second'), b'x' * 1000)
+        self.assertEqual(cache.stats()['l2']['hits'], 1)
+        with mock.patch('core.cache.time.monotonic',
+                        return_value=time.monotonic() + 10):
+            cache.get('third')
+        self.assertEqual(cache.stats()['l2']['hits'], 2)
+
+    def test_splice_keeps_cached_response(self):
+        '''Подстановка личных кусков не меняет общий объект из L1'''
+        cached = HttpResponse(marker('user_nav', {}))
+        self.first.set('page', cached)
+        request = RequestFactory().get('/')
+        request.user = mock.Mock(is_authenticated=False)
+        response = splice(request, self.first.get('page'))
+        self.assertIsNot(response, cached)
+        self.assertIn(b'<!--personal:user_nav:', cached.content)
@@ -0,0 +1,169 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+
+from posts.caching import get_or_compute, should_refresh
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class StampedeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.compute = mock.Mock(return_value='свежее')
+
+    def test_cached_value_computed_once(self):
+        '''Пока запись действительна, значение не пересчитывается'''
+        for _ in range(3):
+            self.assertEqual(get_or_compute('key', self.compute), 'свежее')
+        self.compute.assert_called_once()
+
+    def test_locked_key_serves_stale(self):
+        '''Пока другой запрос держит замок, отдаётся старая копия'''
+        cache.set('stale', 'старое')
+        cache.add('lock:key', True)
+        value = get_or_compute('key', self.compute, stale_key='stale')
+        self.assertEqual(value, 'старое')
+        self.compute.assert_not_called()
+
+    @mock.patch('posts.caching.CACHE_LOCK_WAIT', 0)
+    def test_locked_key_without_stale_computes(self):
+        '''Без старой копии запрос не ждёт дольше CACHE_LOCK_WAIT'''
+        cache.add('lock:key', True)
+        self.assertEqual(get_or_compute('key', self.compute), 'свежее')
+
+    def test_lock_released_and_stale_saved(self):
+        '''После пересчёта замок снят, старая копия обновлена'''
+        get_or_compute('key', self.compute, stale_key='stale')
+        self.assertIsNone(cache.get('lock:key'))
+        self.assertEqual(cache.get('stale'), 'свежее')
+
+    def test_not_cacheable(self):
+        '''Неподходящее значение не кладётся в кеш'''
+        get_or_compute('key', self.compute, cacheable=lambda value: False)
+        get_or_compute('key', self.compute, cacheable=lambda value: False)
+        self.assertEqual(self.compute.call_count, 2)
+
+    def test_early_expiration(self):
+        '''Дорогая запись обновляется заранее, дешёвая — нет'''
+        expires = time.time() + 10
+        with mock.patch('posts.caching.random.random', return_value=0.99):
+            self.assertTrue(should_refresh(expires, delta=5))
+            self.assertFalse(should_refresh(expires, delta=0.001))
+        cache.set('key', ('старое', expires, 5))
+        with mock.patch('posts.caching.random.random', return_value=0.99):
+            self.assertEqual(get_or_compute('key', self.compute), 'свежее')
+
+    def test_fragment_tag(self):
+        '''Тег cache учитывает версию данных страницы'''
+        source = Template('{% load cache_fragments %}'
+                          '{% cache 60 part %}{{ value }}{% endcache %}')
+        request = RequestFactory().get('/')
+        request.splice_personal = True
+        render = lambda value, version: source.render(Context(  # noqa: E731
+            {'value': value, 'cache_version': version, 'request': request}))
+        self.assertEqual(render('первое', '1'), 'первое')
+        self.assertEqual(render('второе', '1'), 'первое')
+        self.assertEqual(render('второе', '2'), 'второе')
+
+    @mock.patch('posts.caching.CACHE_LOCK_WAIT', 0)
+    def test_fragment_tag_skips_personal_render(self):
+        '''Кусок автора из POST не попадает к другим пользователям'''
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        post = Post.objects.create(text='Текст', author=author)
+        url = reverse('posts:post_detail', kwargs={'post_id': post.id})
+        edit = reverse('posts:post_edit', kwargs={'post_id': post.id})
+        author_client = Client()
+        author_client.force_login(author)
+        self.assertContains(author_client.post(url), edit)
+        reader_client = Client()
+        reader_client.force_login(reader)
+        self.assertNotContains(reader_client.post(url), edit)
+        # замки заняты: запрос берёт старые копии, если они есть
+        add = cache.add
+        locked = lambda key, *args: (  # noqa: E731
+            not key.startswith('lock:') and add(key, *args))
+        with mock.patch.object(cache, 'add', side_effect=locked):
+            self.assertNotContains(Client().get(url), edit)
+        self.assertNotContains(reader_client.get(url), edit)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.group = Group.objects.create(title='Группа', slug='group',
+                                          description='Описание')
+        self.post = Post.objects.create(text='Текст', author=self.author,
+                                        group=self.group)
+        self.guest_client = Client()
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'group'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+
+    def test_not_modified_without_queries(self):
+        '''Повторный запрос с ETag или датой получает 304 без базы'''
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                with self.assertNumQueries(0):
+                    by_etag = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag'])
+                    by_date = self.guest_client.get(
+                        url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                self.assertEqual(by_etag.status_code, 304)
+                self.assertEqual(by_date.status_code, 304)
+
+    def test_changes_invalidate_etag(self):
+        '''Новый пост или комментарий меняет ETag зависимых страниц'''
+        etags = {url: self.guest_client.get(url)['ETag'] for url in self.urls}
+        Comment.objects.create(post=self.post, author=self.author,
+                               text='Комментарий')
+        Post.objects.create(text='Новый', author=self.author,
+                            group=self.group)
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_user(self):
+        '''У вошедшего пользователя своя копия страницы'''
+        url = self.urls[2]
+        etag = self.guest_client.get(url)['ETag']
+        client = Client()
+        client.force_login(self.author)
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_post_detail_follows_author_and_group(self):
+        '''Страница поста обновляется с новым постом автора и группой'''
+        url = self.urls[3]
+        etag = self.guest_client.get(url)['ETag']
+        Post.objects.create(text='Второй', author=self.author)
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, '<span >2</span>')
+        self.group.title = 'Новое название'
+        self.group.save()
+        response = self.guest_client.get(url,
+                                         HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertContains(response, 'Новое название')
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_follow_updates_follower_profile(self):
+        '''Подписка обновляет профиль и автора, и читателя'''
+        reader = User.objects.create_user(username='reader')
+        url = reverse('posts:profile', kwargs={'username': 'reader'})
+        etag = self.guest_client.get(url)['ETag']
+        Follow.objects.create(user=reader, author=self.author)
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'подписок: 1')
@@ -0,0 +1,72 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase
+
+from posts.models import AuthorStats, Comment, Follow, Post, PostStats
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.post = Post.objects.create(text='Тестовый текст',
+                                        author=self.author)
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_post_counter(self):
+        '''Счётчик постов автора меняется при создании и удалении'''
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        Post.objects.create(text='Второй пост', author=self.author)
+        self.assertEqual(self.stats(self.author).posts_count, 2)
+        self.post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+
+    def test_comment_counter(self):
+        '''Счётчик комментариев поста меняется при создании и удалении'''
+        comment = Comment.objects.create(post=self.post, author=self.reader,
+                                         text='Комментарий')
+        self.assertEqual(
+            PostStats.objects.get(post=self.post).comments_count, 1)
+        comment.delete()
+        self.assertEqual(
+            PostStats.objects.get(post=self.post).comments_count, 0)
+
+    def test_follow_counters(self):
+        '''Подписка меняет счётчики подписчиков и подписок'''
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        follow.delete()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_counter_failure_rolls_back_row(self):
+        '''Сбой счётчика откатывает и сохранённую строку'''
+        with mock.patch('posts.counters.change',
+                        side_effect=DatabaseError('счётчик')):
+            with self.assertRaises(DatabaseError):
+                Follow.objects.create(user=self.reader, author=self.author)
+        self.assertFalse(Follow.objects.exists())
+
+    def test_rebuild_counters_repairs_drift(self):
+        '''rebuild_counters чинит разошедшиеся счётчики'''
+        AuthorStats.objects.filter(user=self.author).update(posts_count=7)
+        AuthorStats.objects.filter(user=self.reader).delete()
+        Follow.objects.bulk_create(
+            [Follow(user=self.reader, author=self.author)])
+        out = StringIO()
+        call_command('rebuild_counters', stdout=out)
+        self.assertIn('posts_count: исправлено 1', out.getvalue())
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
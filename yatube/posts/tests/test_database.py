@@ -0,0 +1,59 @@
+import copy
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase
+
+from yatube.settings import DATABASE_PROFILES
+
+
+class DatabaseProfileTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def connect(self, profile):
+        config = copy.deepcopy(DATABASE_PROFILES[profile])
+        config['NAME'] = os.path.join(self.directory, f'{profile}.sqlite3')
+        connection = ConnectionHandler({'default': config})['default']
+        self.addCleanup(connection.close)
+        connection.ensure_connection()
+        return connection
+
+    def pragma(self, connection, name):
+        return connection.connection.execute(f'PRAGMA {name}').fetchone()[0]
+
+    def test_production_pragmas(self):
+        '''Новое соединение настраивается по PRAGMAS профиля'''
+        connection = self.connect('production')
+        self.assertEqual(self.pragma(connection, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(connection, 'synchronous'), 1)
+        self.assertEqual(self.pragma(connection, 'busy_timeout'), 5000)
+        self.assertEqual(self.pragma(connection, 'mmap_size'),
+                         256 * 1024 * 1024)
+
+    def test_default_profile_untouched(self):
+        '''Профиль по умолчанию оставляет настройки SQLite как есть'''
+        connection = self.connect('default')
+        self.assertEqual(self.pragma(connection, 'journal_mode'), 'delete')
+
+    def test_persistent_connection(self):
+        '''В бою соединение переживает конец запроса'''
+        connection = self.connect('production')
+        raw = connection.connection
+        connection.close_if_unusable_or_obsolete()
+        self.assertIs(connection.connection, raw)
+
+    def test_benchmark_command(self):
+        '''Замер чтения и записи проходит без ошибок блокировки'''
+        out = StringIO()
+        call_command('bench_db', profile=['production'], readers=1,
+                     writers=1, duration=0.2, stdout=out)
+        self.assertIn('read: ', out.getvalue())
+        self.assertNotIn('locked', out.getvalue())
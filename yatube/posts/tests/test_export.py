@@ -0,0 +1,67 @@
+import csv
+import json
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Post
+
+User = get_user_model()
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.post = Post.objects.create(text='Первый', author=self.author)
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Комментарий')
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def export(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('export', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_ndjson_export(self):
+        '''Команда выгружает строки в NDJSON и печатает водяной знак'''
+        out, err = self.export('posts')
+        record = json.loads(out.splitlines()[0])
+        self.assertEqual(record['text'], 'Первый')
+        self.assertEqual(record['author__username'], 'author')
+        self.assertIn(self.post.pub_date.isoformat(), err)
+
+    def test_incremental_export(self):
+        '''С водяным знаком выгружаются только новые строки'''
+        _, err = self.export('posts')
+        since = err.split()[-1]
+        Post.objects.create(text='Второй', author=self.author)
+        out, _ = self.export('posts', '--since', since)
+        texts = [json.loads(line)['text'] for line in out.splitlines()]
+        self.assertEqual(texts, ['Второй'])
+
+    def test_csv_export(self):
+        '''CSV начинается с заголовка'''
+        out, _ = self.export('follows', '--format', 'csv')
+        header, row = list(csv.reader(StringIO(out)))
+        self.assertEqual(header,
+                         ['id', 'user__username', 'author__username'])
+        self.assertEqual(row[1:], ['reader', 'author'])
+
+    def test_admin_endpoint(self):
+        '''Потоковая выгрузка доступна только персоналу'''
+        url = reverse('admin:posts_export', kwargs={'kind': 'comments'})
+        client = Client()
+        client.force_login(self.reader)
+        self.assertEqual(client.get(url).status_code, 302)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        client.force_login(staff)
+        response = client.get(url)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(json.loads(lines[0])['text'], 'Комментарий')
+        response = client.get(url, {'since': 'вчера'})
+        self.assertEqual(response.status_code, 400)
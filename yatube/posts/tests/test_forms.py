@@ -1,18 +1,33 @@
 import shutil
 import tempfile
+import threading
+from unittest import mock
 
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase, override_settings
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.core.files.storage import default_storage
+from sorl.thumbnail import get_thumbnail
 
+from core import deferred
 from posts.models import Group, Post, Comment
 from posts.forms import PostForm
+from posts.thumbnails import pregenerate
+from yatube.settings import THUMBNAIL_PRESETS
 
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B')
 User = get_user_model()
 
 
@@ -83,6 +98,37 @@ class FormsTests(TestCase):
             ).exists()
         )
 
+    def test_upload_schedules_thumbnails(self):
+        '''Загруженная картинка уходит в очередь миниатюр'''
+        uploaded = SimpleUploadedFile(
+            name='posts/queued.gif',
+            content=SMALL_GIF,
+            content_type='image/gif'
+        )
+        with mock.patch('posts.forms.schedule') as schedule:
+            self.authorized_client.post(
+                reverse('posts:post_create'),
+                data={'text': 'С картинкой', 'image': uploaded},
+            )
+        post = Post.objects.get(text='С картинкой')
+        schedule.assert_called_once_with(post.image.name)
+        with mock.patch('posts.forms.schedule') as schedule:
+            self.authorized_client.post(
+                reverse('posts:post_edit', kwargs={'post_id': post.id}),
+                data={'text': 'Без новой картинки'},
+            )
+        schedule.assert_not_called()
+
+    def test_pregenerate_thumbnails(self):
+        '''Миниатюры всех размеров готовятся заранее'''
+        name = default_storage.save(
+            'posts/warm.gif', SimpleUploadedFile('warm.gif', SMALL_GIF))
+        pregenerate(name)
+        for geometry, options in THUMBNAIL_PRESETS:
+            with self.subTest(geometry=geometry):
+                thumbnail = get_thumbnail(name, geometry, **options)
+                self.assertTrue(default_storage.exists(thumbnail.name))
+
     def test_edit_post(self):
         '''Тестирование Редактирования'''
         posts_count = Post.objects.count()
@@ -125,3 +171,39 @@ class FormsTests(TestCase):
                 author=self.user
             ).exists()
         )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsAfterResponseTests(TransactionTestCase):
+    """on_commit срабатывает только вне транзакции TestCase."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='test-user')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_thumbnails_after_response(self):
+        '''Миниатюры готовит пул после ответа, а не поток запроса'''
+        uploaded = SimpleUploadedFile(
+            name='posts/after.gif',
+            content=SMALL_GIF,
+            content_type='image/gif'
+        )
+        threads = []
+        with mock.patch('posts.thumbnails.pregenerate') as pregenerate:
+            pregenerate.side_effect = lambda name: threads.append(
+                threading.current_thread().name)
+            self.authorized_client.post(
+                reverse('posts:post_create'),
+                data={'text': 'С картинкой', 'image': uploaded},
+            )
+            deferred.drain()
+            pregenerate.assert_called_once_with(
+                Post.objects.get(text='С картинкой').image.name)
+        self.assertTrue(threads[0].startswith('after-response'))
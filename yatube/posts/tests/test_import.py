@@ -0,0 +1,122 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts.models import (AuthorStats, Comment, Follow, Group, Post,
+                          PostStats, TimelineEntry)
+
+User = get_user_model()
+
+
+class BulkImportTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(title='Группа', slug='group')
+
+    def load(self, kind, records):
+        handle, path = tempfile.mkstemp(suffix='.ndjson')
+        with os.fdopen(handle, 'w', encoding='utf-8') as file:
+            for record in records:
+                file.write(record if isinstance(record, str)
+                           else json.dumps(record, ensure_ascii=False))
+                file.write('\n')
+        out, err = StringIO(), StringIO()
+        try:
+            call_command('bulk_import', kind, path, '--batch-size', '2',
+                         stdout=out, stderr=err)
+        finally:
+            os.remove(path)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_posts(self):
+        '''Посты загружаются с датами из файла, ошибки пропускаются'''
+        out, err = self.load('posts', [
+            {'text': 'Первый', 'author__username': 'author',
+             'group__slug': 'group', 'pub_date': '2020-01-02T03:04:05'},
+            {'text': 'Второй', 'author__username': 'author'},
+            {'text': 'Третий', 'author__username': 'nobody'},
+            {'text': 'Четвёртый', 'author__username': 'author',
+             'group__slug': 'missing'},
+            'не json',
+        ])
+        self.assertIn('Принято 2 строк', out)
+        self.assertIn('строк/с', out)
+        self.assertIn('строка 3: нет пользователя nobody', err)
+        self.assertIn('строка 4: нет группы missing', err)
+        self.assertIn('строка 5', err)
+        post = Post.objects.get(text='Первый')
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).posts_count, 2)
+
+    def test_import_comments(self):
+        '''Комментарии привязываются к существующим постам'''
+        post = Post.objects.create(text='Пост', author=self.author)
+        out, err = self.load('comments', [
+            {'post_id': post.id, 'author__username': 'reader',
+             'text': 'Комментарий'},
+            {'post_id': post.id + 100, 'author__username': 'reader',
+             'text': 'Мимо'},
+        ])
+        self.assertEqual(Comment.objects.get().text, 'Комментарий')
+        self.assertIn('нет поста', err)
+        self.assertEqual(
+            PostStats.objects.get(post=post).comments_count, 1)
+
+    def test_import_follows_ignores_duplicates(self):
+        '''Повторные подписки не ломают загрузку, ленты заполняются'''
+        post = Post.objects.create(text='Пост', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        TimelineEntry.objects.all().delete()
+        edge = {'user__username': 'reader', 'author__username': 'author'}
+        out, _ = self.load('follows', [edge, edge])
+        self.assertIn('Принято 0 строк', out)
+        self.assertIn('уже загружено 2', out)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+
+    def test_malformed_rows_skipped(self):
+        '''Поля неверного типа отбрасывают строку, а не всю загрузку'''
+        out, err = self.load('posts', [
+            {'text': 5, 'author__username': 'author'},
+            {'text': 'Список', 'author__username': ['author']},
+            {'id': 'abc', 'text': 'Строковый id',
+             'author__username': 'author'},
+            {'id': 2 ** 70, 'text': 'Огромный id',
+             'author__username': 'author'},
+            {'text': 'Дата', 'author__username': 'author', 'pub_date': 1},
+            {'id': 500, 'text': 'Годный', 'author__username': 'author'},
+        ])
+        self.assertIn('Принято 1 строк', out)
+        self.assertIn('строка 1: поле text', err)
+        self.assertIn('строка 2: поле author__username', err)
+        self.assertIn('строка 3: поле id', err)
+        self.assertIn('строка 4: поле id', err)
+        self.assertIn('строка 5: поле pub_date', err)
+        self.assertIn('Производные данные пересобраны', out)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).posts_count, 1)
+        out, err = self.load('comments', [
+            {'post_id': [500], 'author__username': 'reader', 'text': 'Нет'},
+            {'post_id': 500, 'author__username': 'reader', 'text': None},
+            {'post_id': 500, 'author__username': 'reader', 'text': 'Да'},
+        ])
+        self.assertIn('Принято 1 строк', out)
+        self.assertEqual(Comment.objects.get().text, 'Да')
+
+    def test_existing_rows_not_counted(self):
+        '''Строки, которые уже есть в базе, не входят в принятые'''
+        record = {'id': 700, 'text': 'Пост', 'author__username': 'author'}
+        self.load('posts', [record])
+        out, _ = self.load('posts', [record, record])
+        self.assertIn('Принято 0 строк', out)
+        self.assertIn('уже загружено 2', out)
+        self.assertEqual(Post.objects.count(), 1)
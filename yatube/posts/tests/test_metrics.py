@@ -0,0 +1,52 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.metrics import registry
+from posts.models import Post
+
+User = get_user_model()
+
+
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.author = User.objects.create_user(username='author')
+        Post.objects.create(text='Тестовый текст', author=self.author)
+        self.guest_client = Client()
+
+    def test_server_timing_header(self):
+        '''Ответ содержит замеры базы, кеша, шаблонов и общего времени'''
+        response = self.guest_client.get(reverse('posts:index'))
+        header = response['Server-Timing']
+        for metric in ('db;dur=', 'cache;desc="0 hits, 2 misses"',
+                       'tpl;dur=', 'total;dur='):
+            self.assertIn(metric, header)
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertIn('cache;desc="1 hits, 0 misses"',
+                      response['Server-Timing'])
+
+    def test_histograms_by_url_name(self):
+        '''Замеры копятся в гистограммах по имени URL'''
+        self.guest_client.get(reverse('posts:index'))
+        self.guest_client.get(reverse('posts:index'))
+        route = registry.snapshot()['posts:index']
+        self.assertEqual(route['total_ms']['count'], 2)
+        self.assertEqual(sum(route['total_ms']['buckets'].values()), 2)
+        self.assertEqual(route['cache_hits'], 1)
+        self.assertEqual(route['cache_misses'], 2)
+        self.assertGreater(route['queries']['sum'], 0)
+
+    def test_metrics_endpoint_for_staff_only(self):
+        '''Гистограммы отдаются только персоналу'''
+        self.guest_client.get(reverse('posts:index'))
+        response = self.guest_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 302)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        staff_client = Client()
+        staff_client.force_login(staff)
+        response = staff_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('posts:index', response.json())
@@ -0,0 +1,113 @@
+import time
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.ratelimit import TokenBucket
+from posts.models import Comment, Post
+from yatube.settings import RATE_LIMITS
+
+User = get_user_model()
+
+
+class TokenBucketTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.bucket = TokenBucket('test', capacity=3, period=30)
+        self.now = time.time()
+
+    def take(self, shift=0):
+        with mock.patch('core.ratelimit.time.time',
+                        return_value=self.now + shift):
+            return self.bucket.take('client')
+
+    def test_burst_then_refill(self):
+        '''capacity запросов подряд, затем по токену в period/capacity'''
+        self.assertEqual([self.take() for _ in range(3)], [0, 0, 0])
+        self.assertEqual(self.take(), 10)
+        self.assertEqual(self.take(5), 5)
+        self.assertEqual(self.take(10), 0)
+        self.assertEqual(self.take(10), 10)
+
+    def test_idle_does_not_exceed_capacity(self):
+        '''Простой не копит запас больше capacity'''
+        self.take()
+        results = [self.take(1000) for _ in range(4)]
+        self.assertEqual(results[:3], [0, 0, 0])
+        self.assertGreater(results[3], 0)
+
+    def test_parallel_burst_shares_window(self):
+        '''Запросы, заставшие полное ведро одновременно, делят одно окно'''
+        self.take()
+        with mock.patch('core.ratelimit.time.time',
+                        return_value=self.now + 1000):
+            starts = {self.bucket.rebase('client', self.now + 1000 + shift)
+                      for shift in range(5)}
+            self.assertEqual(len(starts), 1)
+            results = [self.bucket.take('client') for _ in range(5)]
+        self.assertEqual(results[:3], [0, 0, 0])
+        self.assertGreater(results[3], 0)
+
+    def test_buckets_are_separate(self):
+        '''У каждого клиента своё ведро'''
+        for _ in range(3):
+            self.take()
+        self.assertGreater(self.take(), 0)
+        with mock.patch('core.ratelimit.time.time', return_value=self.now):
+            self.assertEqual(self.bucket.take('other'), 0)
+
+
+class RateLimitMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(text='Текст', author=self.author)
+        self.url = reverse('posts:add_comment',
+                           kwargs={'post_id': self.post.id})
+        self.capacity = RATE_LIMITS['posts:add_comment']['capacity']
+
+    def login(self, username):
+        client = Client()
+        client.force_login(User.objects.create_user(username=username))
+        return client
+
+    def test_429_with_retry_after(self):
+        '''Сверх лимита запись не выполняется, ответ 429 с Retry-After'''
+        client = self.login('writer')
+        for _ in range(self.capacity):
+            response = client.post(self.url, {'text': 'Комментарий'})
+            self.assertEqual(response.status_code, 302)
+        response = client.post(self.url, {'text': 'Лишний'})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(Comment.objects.count(), self.capacity)
+        self.assertEqual(
+            self.login('other').post(self.url, {'text': 'Свой'}).status_code,
+            302)
+
+    def test_reads_and_guests(self):
+        '''Чтение не ограничено, гости делят ведро по IP'''
+        client = self.login('reader')
+        for _ in range(self.capacity + 1):
+            self.assertEqual(client.get(self.url).status_code, 302)
+        for _ in range(self.capacity):
+            self.client.post(self.url, REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(
+            self.client.post(self.url, REMOTE_ADDR='10.0.0.1').status_code,
+            429)
+        self.assertEqual(
+            self.client.post(self.url, REMOTE_ADDR='10.0.0.2').status_code,
+            302)
+
+    def test_benchmark_command(self):
+        '''Замер печатает цену проверки для выбранного бэкенда'''
+        out = StringIO()
+        call_command('bench_ratelimit', backend=['locmem'], repeat=10,
+                     stdout=out)
+        self.assertIn('allowed: ', out.getvalue())
+        self.assertIn('denied: ', out.getvalue())
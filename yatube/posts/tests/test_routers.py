@@ -0,0 +1,111 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.test import Client, TransactionTestCase
+from django.urls import reverse
+
+from core import routers
+from core.middleware import PIN_COOKIE
+from posts.models import Group, Post, User
+
+
+class ReplicaRouterTests(TransactionTestCase):
+    """Реплика — копия тестовой базы в файле, снятая в начале теста:
+    всё, что записано после копии, реплика не видит, как при отставании."""
+
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.directory, 'replica.sqlite3')
+        connections.databases['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': cls.path}
+        connections.ensure_defaults('replica')
+        connections.prepare_test_settings('replica')
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections.databases['replica']
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.dict(routers.DATABASE_REPLICAS,
+                                  {'replica': self.path})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.guest_client = Client()
+        self.url = reverse('posts:group_list', kwargs={'slug': 'late'})
+
+    def copy_replica(self):
+        connections['replica'].close()
+        source = connections['default']
+        source.ensure_connection()
+        target = sqlite3.connect(self.path)
+        source.connection.backup(target)
+        target.close()
+
+    def test_router(self):
+        '''Вне запроса и в транзакции — основная база, в запросе — реплика'''
+        self.copy_replica()
+        router = routers.ReplicaRouter()
+        self.assertEqual(router.db_for_read(Post), 'default')
+        token = routers.current.set(routers.Routing())
+        try:
+            self.assertEqual(router.db_for_read(Post), 'replica')
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Post), 'default')
+            with routers.primary():
+                self.assertEqual(router.db_for_read(Post), 'default')
+            self.assertEqual(router.db_for_write(Post), 'default')
+            self.assertEqual(router.db_for_read(Post), 'default')
+        finally:
+            routers.current.reset(token)
+        self.assertFalse(router.allow_migrate('replica', 'posts'))
+
+    @mock.patch('posts.caching.REPLICA_PIN_SECONDS', 0)
+    def test_reads_go_to_replica(self):
+        '''Запрос читает реплику и не видит данных новее копии'''
+        self.copy_replica()
+        Group.objects.create(title='Поздняя', slug='late', description='-')
+        self.assertEqual(self.guest_client.get(self.url).status_code, 404)
+
+    def test_recent_change_reads_primary(self):
+        '''Только что изменённые данные читаются из основной базы'''
+        self.copy_replica()
+        Group.objects.create(title='Поздняя', slug='late', description='-')
+        self.assertEqual(self.guest_client.get(self.url).status_code, 200)
+
+    @mock.patch('posts.caching.REPLICA_PIN_SECONDS', 0)
+    def test_read_your_writes(self):
+        '''После записи клиент закреплён за основной базой'''
+        self.copy_replica()
+        Group.objects.create(title='Поздняя', slug='late', description='-')
+        response = self.reader_client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'author'}))
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(self.reader_client.get(self.url).status_code, 200)
+        self.assertEqual(self.guest_client.get(self.url).status_code, 404)
+
+    @mock.patch('posts.caching.REPLICA_PIN_SECONDS', 0)
+    def test_lagging_replica_not_read(self):
+        '''Реплику, скопированную раньше срока закрепления, не читают'''
+        self.copy_replica()
+        Group.objects.create(title='Поздняя', slug='late', description='-')
+        copied = time.time() - routers.REPLICA_PIN_SECONDS - 1
+        os.utime(self.path, (copied, copied))
+        self.assertEqual(self.guest_client.get(self.url).status_code, 200)
@@ -0,0 +1,79 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Post
+from yatube.settings import POSTS_SHOW
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='author')
+
+    def search(self, query, **params):
+        return self.client.get(reverse('posts:search'), {'q': query, **params})
+
+    def test_search_finds_and_highlights(self):
+        '''Поиск находит пост и подсвечивает совпадение'''
+        post = Post.objects.create(text='Кот <b>ловит</b> мышей',
+                                   author=self.user)
+        Post.objects.create(text='Про собак', author=self.user)
+        response = self.search('мыш')
+        self.assertEqual(list(response.context['page_obj']), [post])
+        self.assertContains(response, '<mark>мышей</mark>')
+        self.assertContains(response, '&lt;b&gt;ловит&lt;/b&gt;')
+
+    def test_search_ranks_better_matches_first(self):
+        '''Пост с большим числом совпадений выше'''
+        weak = Post.objects.create(text='закат и море и горы и лес',
+                                   author=self.user)
+        strong = Post.objects.create(text='закат закат закат',
+                                     author=self.user)
+        page = self.search('закат').context['page_obj']
+        self.assertEqual(list(page), [strong, weak])
+
+    def test_index_follows_edit_and_delete(self):
+        '''Индекс обновляется при изменении и удалении поста'''
+        post = Post.objects.create(text='старый текст', author=self.user)
+        post.text = 'новый текст'
+        post.save()
+        self.assertFalse(self.search('старый').context['page_obj'])
+        self.assertTrue(self.search('новый').context['page_obj'])
+        post.delete()
+        self.assertFalse(self.search('новый').context['page_obj'])
+
+    def test_search_cursor_pagination(self):
+        '''Результаты поиска листаются через cursor'''
+        for i in range(POSTS_SHOW + 3):
+            Post.objects.create(text=f'рассвет номер {i}', author=self.user)
+        first = self.search('рассвет').context['page_obj']
+        self.assertEqual(len(first), POSTS_SHOW)
+        second = self.search(
+            'рассвет', cursor=first.next_cursor).context['page_obj']
+        self.assertEqual(len(second), 3)
+        self.assertFalse(set(first) & set(second))
+        back = self.search(
+            'рассвет', cursor=second.previous_cursor).context['page_obj']
+        self.assertEqual(list(back), list(first))
+
+    def test_search_query_syntax_is_escaped(self):
+        '''Спецсимволы FTS5 в запросе не ломают поиск'''
+        Post.objects.create(text='обычный пост', author=self.user)
+        for query in ('"', 'AND', 'пост*)', ''):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query).status_code, 200)
+
+    def test_admin_search_uses_index(self):
+        '''Поиск в админке идёт по индексу'''
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        self.client.force_login(admin)
+        found = Post.objects.create(text='редкое слово', author=self.user)
+        Post.objects.create(text='другое', author=self.user)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'редк'})
+        self.assertEqual(list(response.context['cl'].queryset), [found])
@@ -0,0 +1,170 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import Client, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from core import deferred
+from posts import snapshots
+from posts.models import Follow, Group, Post
+
+User = get_user_model()
+
+
+class SnapshotMixin:
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        for name, value in (('SNAPSHOT_ROOT', self.directory),
+                            ('SNAPSHOT_PAGES', 2), ('SNAPSHOTS', True)):
+            patcher = mock.patch.object(snapshots, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.author = User.objects.create_user(username='author')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        self.other = Group.objects.create(
+            title='Другая', slug='other', description='Описание')
+        self.posts = [
+            Post.objects.create(text=f'Пост {number}', author=self.author,
+                                group=self.group)
+            for number in range(25)
+        ]
+        self.group_url = reverse('posts:group_list',
+                                 kwargs={'slug': self.group.slug})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def files(self, kind, ident):
+        return sorted(os.listdir(snapshots.directory(kind, ident)))
+
+
+class SnapshotTests(SnapshotMixin, TestCase):
+    def test_build_first_pages(self):
+        '''Собираются первые SNAPSHOT_PAGES страниц группы'''
+        self.assertEqual(snapshots.build('group', self.group.slug), 2)
+        self.assertEqual(len(self.files('group', self.group.slug)), 2)
+        self.assertEqual(snapshots.build('group', self.other.slug), 1)
+
+    def test_guest_served_from_snapshot(self):
+        '''Гость получает копию без запросов к базе, как и страницу view'''
+        dynamic = self.client.get(self.group_url)
+        snapshots.build('group', self.group.slug)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.group_url)
+        self.assertEqual(response.content, dynamic.content)
+        cursor = dynamic.context['page_obj'].next_cursor
+        with self.assertNumQueries(0):
+            page = self.client.get(f'{self.group_url}?cursor={cursor}')
+        self.assertContains(page, 'Пост 14')
+        third = page.content.decode().split('cursor=')[-1].split('"')[0]
+        with self.assertNumQueries(2):
+            self.client.get(f'{self.group_url}?cursor={third}')
+
+    def test_personal_fragments_spliced(self):
+        '''В копию подставляется меню вошедшего пользователя'''
+        snapshots.build('group', self.group.slug)
+        client = Client()
+        client.force_login(self.author)
+        response = client.get(self.group_url)
+        self.assertContains(response, 'Пост 24')
+        self.assertContains(response, reverse('posts:post_create'))
+        self.assertNotContains(response, '<!--personal:')
+
+    def test_stale_snapshot_falls_back(self):
+        '''После изменения данных старая копия не отдаётся'''
+        snapshots.build('group', self.group.slug)
+        Post.objects.create(text='Свежий пост', author=self.author,
+                            group=self.group)
+        self.assertContains(self.client.get(self.group_url), 'Свежий пост')
+
+    def test_profile_snapshot_cached(self):
+        '''Копия профиля ложится в кеш страниц с метками'''
+        url = reverse('posts:profile', kwargs={'username': 'author'})
+        snapshots.build('profile', 'author')
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, 'Пост 24')
+        client = Client()
+        client.force_login(User.objects.create_user(username='reader'))
+        self.assertContains(client.get(url), 'Подписаться')
+
+    def test_command_builds_and_prunes(self):
+        '''Команда собирает группы и популярных авторов, лишнее удаляет'''
+        lonely = User.objects.create_user(username='lonely')
+        Follow.objects.create(user=lonely, author=self.author)
+        snapshots.build('profile', 'lonely')
+        output = StringIO()
+        with mock.patch.object(snapshots, 'SNAPSHOT_PROFILES', 1), \
+                mock.patch.object(snapshots, 'shared_cache',
+                                  return_value=True):
+            call_command('build_snapshots', workers=1, stdout=output)
+        self.assertIn('Копий страниц: 5', output.getvalue())
+        self.assertIn('удалено устаревших копий: 1', output.getvalue())
+        self.assertTrue(os.path.isdir(snapshots.directory('group', 'other')))
+        self.assertFalse(
+            os.path.isdir(snapshots.directory('profile', 'lonely')))
+
+    def test_requires_shared_cache(self):
+        '''С кешем в памяти процесса копии не собираются'''
+        self.assertEqual([error.id for error in snapshots.check_cache(None)],
+                         ['posts.E001'])
+        with self.assertRaises(CommandError):
+            call_command('build_snapshots', workers=1, stdout=StringIO())
+
+
+class SnapshotRebuildTests(SnapshotMixin, TransactionTestCase):
+    def test_changed_post_rebuilds_affected_snapshots(self):
+        '''Правка поста пересобирает только копии его группы и автора'''
+        for kind, ident in (('group', 'group'), ('group', 'other'),
+                            ('profile', 'author')):
+            snapshots.build(kind, ident)
+        other = os.path.join(snapshots.directory('group', 'other'),
+                             self.files('group', 'other')[0])
+        os.utime(other, (0, 0))
+        post = self.posts[-1]
+        post.text = 'Исправленный пост'
+        post.save()
+        self.assertEqual(os.path.getmtime(other), 0)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.group_url)
+        self.assertContains(response, 'Исправленный пост')
+
+    def test_rebuild_after_response(self):
+        '''В запросе копия пересобирается после ответа'''
+        snapshots.build('group', 'group')
+        client = Client()
+        client.force_login(self.author)
+        with mock.patch.object(snapshots, 'build') as build:
+            client.post(reverse('posts:post_create'),
+                        {'text': 'Новый', 'group': self.group.id})
+            deferred.drain()
+        build.assert_any_call('group', 'group')
+
+    def test_new_post_rebuilds_profile(self):
+        '''Новый пост попадает в пересобранную копию профиля'''
+        url = reverse('posts:profile', kwargs={'username': 'author'})
+        snapshots.build('profile', 'author')
+        self.client.get(url)
+        Post.objects.create(text='Свежий пост', author=self.author)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, 'Свежий пост')
+        self.assertContains(response, 'Всего постов: 26')
+
+    def test_follow_rebuilds_follower_profile(self):
+        '''Подписка пересобирает копию профиля читателя'''
+        reader = User.objects.create_user(username='reader')
+        snapshots.build('profile', 'reader')
+        Follow.objects.create(user=reader, author=self.author)
+        url = reverse('posts:profile', kwargs={'username': 'reader'})
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, 'подписок: 1')
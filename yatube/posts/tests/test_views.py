@@ -1,16 +1,18 @@
 import shutil
 import tempfile
+from unittest import mock
 
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import Client, TestCase, TransactionTestCase
 from django.urls import reverse
 from django.conf import settings
 from django import forms
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
 
-from posts.models import Post, Group, Follow
-from yatube.settings import POSTS_SHOW
+from posts.models import (AuthorStats, Post, Group, Comment, Follow,
+                          TimelineEntry)
+from yatube.settings import COMMENTS_SHOW, POSTS_SHOW
 from posts.forms import PostForm
 
 
@@ -127,6 +129,16 @@ class PostsPagesTests(TestCase):
         response_post = response.context['post']
         self.assertEqual(response_post, self.post)
 
+    def test_post_detail_personal_fragments(self):
+        '''Ссылка на редактирование и форма комментария только своим'''
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        response = self.client.get(url)
+        self.assertNotContains(response, 'Редактировать пост')
+        self.assertNotContains(response, 'csrfmiddlewaretoken')
+        response = self.authorized_client.get(url)
+        self.assertContains(response, 'Редактировать пост')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
     def test_create_post_correct_context(self):
         '''create_post имеет правильный контекст'''
         response = self.authorized_client.get(reverse('posts:post_create'))
@@ -203,11 +215,42 @@ class PostsPagesTests(TestCase):
         response_len = len(response.context['page_obj'])
         self.assertEqual(response_len, POSTS_SHOW)
 
+    def test_cursor_paginator_pages(self):
+        '''Переход по страницам через ?cursor='''
+        for i in range(0, 13):
+            Post.objects.create(
+                text=f'Тестовый текст {i}',
+                author=self.user,
+                group=self.group,
+            )
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        first_page = self.authorized_client.get(url).context['page_obj']
+        self.assertTrue(first_page.has_next())
+        self.assertFalse(first_page.has_previous())
+        second_page = self.authorized_client.get(
+            url, {'cursor': first_page.next_cursor}).context['page_obj']
+        self.assertEqual(len(second_page), 14 - POSTS_SHOW)
+        self.assertEqual(second_page.number, 2)
+        self.assertFalse(second_page.has_next())
+        self.assertFalse(set(first_page) & set(second_page))
+        back_page = self.authorized_client.get(
+            url, {'cursor': second_page.previous_cursor}).context['page_obj']
+        self.assertEqual(list(back_page), list(first_page))
+        self.assertFalse(back_page.has_previous())
+
+    def test_cursor_paginator_broken_cursor(self):
+        '''Битый cursor открывает первую страницу'''
+        response = self.authorized_client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.context['page_obj'].number, 1)
+        self.assertIn(self.post, response.context['page_obj'])
+
     def test_check_cache(self):
         """Проверка кеша."""
         response = self.client.get(reverse("posts:index"))
         response_1 = response.content
-        self.post.delete()
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
         response2 = self.client.get(reverse("posts:index"))
         response_2 = response2.content
         self.assertEqual(response_1, response_2)
@@ -216,9 +259,34 @@ class PostsPagesTests(TestCase):
         response_3 = response_after_cache_clear.content
         self.assertNotEqual(response_1, response_3)
 
+    def test_cache_invalidated_on_write(self):
+        """Запись в базу сразу сбрасывает кеш зависимых страниц."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+        for url in urls:
+            self.client.get(url)
+        self.post.text = 'Отредактированный текст'
+        self.post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'Отредактированный текст')
+
+    def test_cache_invalidated_on_comment(self):
+        """Новый комментарий сразу виден на странице поста."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        self.client.get(url)
+        Comment.objects.create(post=self.post, author=self.user,
+                               text='Свежий комментарий')
+        self.assertContains(self.client.get(url), 'Свежий комментарий')
+
 
 class FollowTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.following_user = User.objects.create(username='Following')
         self.not_following_user = User.objects.create(username='Unfollowing')
         self.author = User.objects.create(username='author')
@@ -272,3 +340,212 @@ class FollowTests(TestCase):
             reverse('posts:follow_index'))
         posts = len(response.context['page_obj'])
         self.assertEqual(posts, 0)
+
+    def test_new_post_fanned_out_to_followers(self):
+        '''Новый пост попадает в ленту подписчика'''
+        Follow.objects.create(author=self.author, user=self.following_user)
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.following_user, post=new_post).exists())
+        response = self.following_user_client.get(
+            reverse('posts:follow_index'))
+        self.assertIn(new_post, response.context['page_obj'])
+
+    def test_unfollow_prunes_timeline(self):
+        '''После отписки посты автора уходят из ленты'''
+        follow = Follow.objects.create(author=self.author,
+                                       user=self.following_user)
+        follow.delete()
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.following_user).exists())
+
+    def test_popular_author_posts_pulled(self):
+        '''Посты популярного автора подтягиваются при чтении'''
+        with mock.patch('posts.timeline.FANOUT_MAX_FOLLOWERS', 0):
+            Follow.objects.create(author=self.author,
+                                  user=self.following_user)
+            Post.objects.create(text='Ещё пост', author=self.author)
+            self.assertFalse(TimelineEntry.objects.exists())
+            response = self.following_user_client.get(
+                reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    @mock.patch('posts.timeline.FANOUT_MAX_FOLLOWERS', 1)
+    def test_timeline_pages_merge_pulled_posts(self):
+        '''Лента листается по курсору через разложенные и подтянутые посты'''
+        popular = User.objects.create(username='popular')
+        Follow.objects.create(author=self.author, user=self.following_user)
+        Follow.objects.create(author=popular, user=self.following_user)
+        Follow.objects.create(author=popular, user=self.not_following_user)
+        for number in range(POSTS_SHOW + 5):
+            Post.objects.create(text=f'Пост {number}',
+                                author=(self.author, popular)[number % 2])
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        url = reverse('posts:follow_index')
+        first = self.following_user_client.get(url).context['page_obj']
+        second = self.following_user_client.get(
+            f'{url}?cursor={first.next_cursor}').context['page_obj']
+        self.assertEqual(list(first) + list(second), expected)
+        self.assertIsNone(second.next_cursor)
+        back = self.following_user_client.get(
+            f'{url}?cursor={second.previous_cursor}').context['page_obj']
+        self.assertEqual(list(back), list(first))
+
+    @mock.patch('posts.timeline.TIMELINE_MAX_ENTRIES', 3)
+    def test_timeline_trimmed(self):
+        '''В ленте остаются только TIMELINE_MAX_ENTRIES свежих постов'''
+        for number in range(4):
+            Post.objects.create(text=f'Пост {number}', author=self.author)
+        Follow.objects.create(author=self.author, user=self.following_user)
+        newest = Post.objects.order_by('-pub_date', '-id')[:3]
+        self.assertQuerysetEqual(
+            TimelineEntry.objects.filter(
+                user=self.following_user).order_by('-pub_date'),
+            [post.pk for post in newest],
+            transform=lambda entry: entry.post_id)
+
+    def test_cached_profile_is_personal(self):
+        '''Общая копия профиля в кеше, кнопка подписки у каждого своя'''
+        Follow.objects.create(author=self.author, user=self.following_user)
+        url = reverse('posts:profile',
+                      kwargs={'username': self.author.username})
+        response = self.following_user_client.get(url)
+        self.assertContains(response, 'Отписаться')
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
+        response = self.not_following_user_client.get(url)
+        self.assertContains(response, 'Подписаться')
+        self.assertContains(response, self.post.text)
+        self.assertContains(response, 'Пользователь: Unfollowing')
+        self.assertNotContains(response, 'Following')
+
+
+@mock.patch('posts.timeline.FANOUT_RESUME_FOLLOWERS', 1)
+@mock.patch('posts.timeline.FANOUT_MAX_FOLLOWERS', 2)
+class FanOutModeTests(TransactionTestCase):
+    """Посты за время подтягивания раскладываются на фиксации."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username='author')
+        self.readers = [User.objects.create(username=f'reader{number}')
+                        for number in range(3)]
+        self.old_post = Post.objects.create(text='Старый пост',
+                                            author=self.author)
+
+    def timeline(self, reader):
+        return set(TimelineEntry.objects.filter(
+            user=reader).values_list('post__text', flat=True))
+
+    def test_resume_only_below_lower_threshold(self):
+        '''Автор возвращается к раскладке только ниже нижнего порога'''
+        follows = [Follow.objects.create(author=self.author, user=reader)
+                   for reader in self.readers]
+        Post.objects.create(text='Пост для всех', author=self.author)
+        self.assertEqual(self.timeline(self.readers[0]), {'Старый пост'})
+        follows[2].delete()
+        self.assertEqual(self.timeline(self.readers[0]), {'Старый пост'})
+        follows[1].delete()
+        self.assertEqual(self.timeline(self.readers[0]),
+                         {'Старый пост', 'Пост для всех'})
+        self.assertIsNone(
+            AuthorStats.objects.get(user=self.author).pulled_since)
+
+    def test_resume_backfills_new_follower(self):
+        '''Подписчик, пришедший за время подтягивания, получает и
+        старые посты'''
+        first, second, late = self.readers
+        follows = [Follow.objects.create(author=self.author, user=reader)
+                   for reader in (first, second, late)]
+        self.assertEqual(self.timeline(late), set())
+        follows[0].delete()
+        follows[1].delete()
+        self.assertEqual(self.timeline(late), {'Старый пост'})
+
+
+class FeedQueriesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            username='author', first_name='Имя', last_name='Фамилия')
+        self.group = Group.objects.create(title='test-title', slug='slug')
+        self.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def create_posts(self, count):
+        for i in range(count):
+            Post.objects.create(text=f'Пост {i}', author=self.author,
+                                group=self.group)
+
+    def test_feed_query_count_does_not_grow(self):
+        '''Число запросов ленты не зависит от числа постов на странице'''
+        urls = {
+            reverse('posts:index'): 1,
+            reverse('posts:group_list', kwargs={'slug': 'slug'}): 2,
+            reverse('posts:profile', kwargs={'username': 'author'}): 2,
+        }
+        for posts_count in (1, POSTS_SHOW):
+            Post.objects.all().delete()
+            self.create_posts(posts_count)
+            for url, queries in urls.items():
+                with self.subTest(url=url, posts_count=posts_count):
+                    cache.clear()
+                    with self.assertNumQueries(queries):
+                        self.client.get(url)
+            with self.subTest(url='follow', posts_count=posts_count):
+                # сессия, пользователь, популярные авторы, посты ленты
+                with self.assertNumQueries(4):
+                    self.reader_client.get(reverse('posts:follow_index'))
+
+    def test_post_detail_query_count(self):
+        '''Комментарии выводятся без запроса на каждого автора'''
+        self.create_posts(1)
+        post = Post.objects.get()
+        for i in range(5):
+            commenter = User.objects.create_user(username=f'commenter{i}')
+            Comment.objects.create(post=post, author=commenter, text='Текст')
+        cache.clear()
+        # автор и группа поста для версий страницы, пост, комментарии
+        with self.assertNumQueries(3):
+            self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': post.id}))
+
+
+class CommentPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(text='Текст', author=self.author)
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.author,
+                    text=f'Комментарий {number:03}')
+            for number in range(COMMENTS_SHOW + 5))
+
+    def test_post_detail_shows_first_batch(self):
+        '''На странице поста первая порция и ссылка на следующую'''
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_SHOW)
+        self.assertEqual(comments[0].text, 'Комментарий 000')
+        self.assertContains(response, 'data-comments-more')
+
+    def test_fragment_returns_next_batch(self):
+        '''Подгрузка отдаёт остаток без повторов одним запросом на порцию'''
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.id})
+        cursor = self.client.get(url).context['comments'].next_cursor
+        cache.clear()
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'cursor': cursor})
+        texts = [comment.text for comment in response.context['comments']]
+        self.assertEqual(texts, [f'Комментарий {number:03}' for number in
+                                 range(COMMENTS_SHOW, COMMENTS_SHOW + 5)])
+        self.assertNotContains(response, 'data-comments-more')
+        self.assertNotContains(response, '<html')
+
+    def test_fragment_for_missing_post(self):
+        '''Для несуществующего поста подгрузка отвечает 404'''
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0}))
+        self.assertEqual(response.status_code, 404)
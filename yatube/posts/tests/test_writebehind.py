@@ -0,0 +1,128 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import writebehind
+from posts.models import Comment, Post, PostStats
+
+User = get_user_model()
+
+
+@mock.patch('posts.views.COMMENT_WRITE_BEHIND', True)
+@mock.patch('posts.writebehind.COMMENT_WRITE_BEHIND', True)
+class WriteBehindTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.queue = writebehind.CommentQueue(
+            os.path.join(self.directory, 'queue.sqlite3'))
+        patcher = mock.patch.object(writebehind, 'queue', self.queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(text='Текст', author=self.author)
+        self.commenter = User.objects.create_user(username='commenter')
+        self.commenter_client = Client()
+        self.commenter_client.force_login(self.commenter)
+        self.detail_url = reverse('posts:post_detail',
+                                  kwargs={'post_id': self.post.id})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def comment(self, text):
+        return self.commenter_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            {'text': text})
+
+    def test_comment_queued_and_visible_to_author(self):
+        '''Комментарий ждёт в очереди, но автор видит его сразу'''
+        etag = self.commenter_client.get(self.detail_url)['ETag']
+        self.comment('Отложенный')
+        self.comment('')
+        self.assertEqual(len(self.queue), 1)
+        self.assertFalse(Comment.objects.exists())
+        response = self.commenter_client.get(self.detail_url,
+                                             HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Отложенный')
+        self.assertContains(response, 'ожидает публикации')
+        self.assertNotContains(self.client.get(self.detail_url),
+                               'Отложенный')
+
+    def test_flush_in_batches(self):
+        '''Воркер переносит очередь пачками с датой и счётчиком'''
+        for number in range(5):
+            self.comment(f'Комментарий {number}')
+        created = self.queue.pending(self.post.id, self.commenter.id)[0]
+        out = StringIO()
+        call_command('flush_comments', once=True, batch_size=2, stdout=out)
+        self.assertEqual(len(self.queue), 0)
+        self.assertEqual(out.getvalue().count('сохранено'), 3)
+        comments = Comment.objects.order_by('id')
+        self.assertEqual([comment.text for comment in comments],
+                         [f'Комментарий {number}' for number in range(5)])
+        self.assertEqual(comments[0].created, created.created)
+        self.assertEqual(PostStats.objects.get(
+            post=self.post).comments_count, 5)
+        response = self.commenter_client.get(self.detail_url)
+        self.assertContains(response, 'Комментарий 0', count=1)
+        self.assertNotContains(response, 'ожидает публикации')
+
+    def test_flush_skips_saved_and_orphaned(self):
+        '''Повторный перенос после сбоя и удалённый пост не дают дублей'''
+        self.comment('Уже сохранён')
+        rows = self.queue.connection.execute(
+            'SELECT post_id, author_id, text, created FROM comments'
+        ).fetchall()
+        writebehind.store(rows)
+        other = Post.objects.create(text='Удалят', author=self.author)
+        self.queue.put(other.id, self.commenter.id, 'К удалённому')
+        other.delete()
+        self.assertEqual(self.queue.flush(), 2)
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_pending_skips_stored_rows(self):
+        '''Сохранённый, но ещё не удалённый из очереди не показан дважды'''
+        self.comment('Перенесён')
+        rows = self.queue.claim(10)
+        writebehind.store([row[1:] for row in rows])
+        self.comment('Ждёт')
+        pending = self.queue.pending(self.post.id, self.commenter.id)
+        self.assertEqual([comment.text for comment in pending], ['Ждёт'])
+
+    def test_submit_not_blocked_by_flush(self):
+        '''Пока пачка пишется в базу, очередь принимает комментарии'''
+        self.comment('Первый')
+        other = writebehind.CommentQueue(self.queue.path)
+        store = writebehind.store
+
+        def slow_store(rows):
+            other.put(self.post.id, self.commenter.id, 'Во время переноса')
+            store(rows)
+
+        with mock.patch('posts.writebehind.BUSY_TIMEOUT', 0.1), \
+                mock.patch('posts.writebehind.store', slow_store):
+            self.assertEqual(self.queue.flush(), 1)
+        self.assertEqual(len(self.queue), 1)
+        self.assertEqual(self.queue.flush(), 1)
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_failed_flush_releases_rows(self):
+        '''Строки упавшего переноса снова доступны, зависшие — по сроку'''
+        self.comment('Первый')
+        with mock.patch('posts.writebehind.store', side_effect=OSError):
+            with self.assertRaises(OSError):
+                self.queue.flush()
+        self.assertEqual(len(self.queue.claim(10)), 1)
+        self.assertEqual(self.queue.flush(), 0)
+        with mock.patch('posts.writebehind.CLAIM_TIMEOUT', -1):
+            self.assertEqual(self.queue.flush(), 1)
+        self.assertEqual(Comment.objects.count(), 1)
@@ -0,0 +1,19 @@
+from sorl.thumbnail import get_thumbnail
+
+from core.deferred import after_response
+from yatube.settings import THUMBNAIL_PRESETS
+
+
+def pregenerate(image_name):
+    """Готовит миниатюры всех размеров, которые выводят шаблоны."""
+    for geometry, options in THUMBNAIL_PRESETS:
+        get_thumbnail(image_name, geometry, **options)
+
+
+def schedule(image_name):
+    """Отдаёт картинку пулу после фиксации транзакции и конца запроса.
+
+    Pillow работает в потоке пула, а не в потоке запроса, и клиент
+    миниатюр не ждёт.
+    """
+    after_response(pregenerate, image_name)
@@ -0,0 +1,198 @@
+from django.db.models import Q
+from django.utils import timezone
+
+from core.deferred import after_response
+from yatube.settings import (FANOUT_BATCH_SIZE, FANOUT_MAX_FOLLOWERS,
+                             FANOUT_RESUME_FOLLOWERS, POSTS_SHOW,
+                             TIMELINE_BACKFILL_LIMIT, TIMELINE_MAX_ENTRIES,
+                             TIMELINE_TRIM_EVERY)
+
+from .models import AuthorStats, Follow, Post, TimelineEntry
+from .utils import CursorPaginator, after_key, feed_queryset
+
+
+def is_fanned_out(author_id):
+    """Посты автора раскладываются по лентам, если его не подтягивают
+    при чтении."""
+    return not AuthorStats.objects.filter(
+        user_id=author_id, pulled_since__isnull=False).exists()
+
+
+def switch_to_pull(author_ids):
+    """Авторы, у которых подписчиков стало больше FANOUT_MAX_FOLLOWERS,
+    дальше подтягиваются при чтении."""
+    AuthorStats.objects.filter(
+        user_id__in=author_ids,
+        pulled_since=None,
+        followers_count__gt=FANOUT_MAX_FOLLOWERS,
+    ).update(pulled_since=timezone.now())
+
+
+def switch_to_fan_out(author_ids):
+    """Возвращает к раскладке авторов, у которых подписчиков не больше
+    FANOUT_RESUME_FOLLOWERS.
+
+    Посты, опубликованные за время подтягивания, раскладываются после
+    ответа, см. resume_fan_out. Отметку снимает один запрос: условие
+    на прежнее значение не даст двум отпискам разложить посты дважды.
+    """
+    pulled = AuthorStats.objects.filter(
+        user_id__in=author_ids,
+        pulled_since__isnull=False,
+        followers_count__lte=FANOUT_RESUME_FOLLOWERS,
+    ).values_list('user_id', 'pulled_since')
+    for author_id, since in pulled:
+        if AuthorStats.objects.filter(
+                user_id=author_id, pulled_since=since).update(
+                    pulled_since=None):
+            after_response(resume_fan_out, author_id, since)
+
+
+def sync_modes():
+    """Сверяет режим раскладки с числом подписчиков после пересчёта."""
+    authors = AuthorStats.objects.values('user_id')
+    switch_to_pull(authors)
+    switch_to_fan_out(authors)
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты подписчиков автора.
+
+    Каждый TIMELINE_TRIM_EVERY-й пост после ответа обрезает ленты
+    подписчиков до TIMELINE_MAX_ENTRIES.
+    """
+    if not is_fanned_out(post.author_id):
+        return
+    followers = list(Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True))
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    if followers and post.id % TIMELINE_TRIM_EVERY == 0:
+        after_response(trim, tuple(followers))
+
+
+def backfill(user, author):
+    """Заполняет ленту свежими постами автора после подписки."""
+    if not is_fanned_out(author.pk):
+        return
+    posts = author.posts.order_by('-pub_date', '-id').values_list(
+        'id', 'pub_date')
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user=user, post_id=post_id, pub_date=pub_date)
+         for post_id, pub_date in posts[:TIMELINE_BACKFILL_LIMIT]],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    trim([user.pk])
+
+
+def resume_fan_out(author_id, since):
+    """Раскладывает по лентам подписчиков посты автора, опубликованные
+    с since, пока его подтягивали при чтении.
+
+    Подписчикам, у которых в ленте нет ни одного поста автора
+    (подписались за это время), раскладываются его свежие посты, как
+    при подписке. Постов не больше TIMELINE_BACKFILL_LIMIT, подписчики
+    идут пачками по FANOUT_BATCH_SIZE: каждая пачка — своя короткая
+    транзакция.
+    """
+    latest = list(Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id').values_list(
+            'id', 'pub_date')[:TIMELINE_BACKFILL_LIMIT])
+    missed = [post for post in latest if post[1] >= since]
+    followers = list(Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True))
+    for start in range(0, len(followers), FANOUT_BATCH_SIZE):
+        batch = followers[start:start + FANOUT_BATCH_SIZE]
+        known = set(TimelineEntry.objects.filter(
+            user_id__in=batch, post__author_id=author_id,
+        ).values_list('user_id', flat=True).distinct())
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=user_id, post_id=post_id,
+                           pub_date=pub_date)
+             for user_id in batch
+             for post_id, pub_date in (missed if user_id in known
+                                       else latest)],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+        trim(batch)
+
+
+def trim(user_ids):
+    """Оставляет в лентах не больше TIMELINE_MAX_ENTRIES свежих постов.
+
+    Граница ищется по индексу ленты, удаление — одним DELETE на ленту.
+    """
+    for user_id in user_ids:
+        entries = TimelineEntry.objects.filter(user_id=user_id)
+        boundary = entries.order_by('-pub_date', '-post_id').values_list(
+            'pub_date', 'post_id')[TIMELINE_MAX_ENTRIES:]
+        for pub_date, post_id in boundary[:1]:
+            entries.filter(
+                Q(pub_date__lt=pub_date)
+                | Q(pub_date=pub_date, post_id__lte=post_id)
+            ).delete()
+
+
+def prune(user, author):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(user=user, post__author=author).delete()
+
+
+def pulled_authors(user):
+    """Авторы подписок, чьи посты не раскладываются при публикации,
+    а подтягиваются при чтении."""
+    followed = Follow.objects.filter(user=user).values('author_id')
+    return list(AuthorStats.objects.filter(
+        user_id__in=followed,
+        pulled_since__isnull=False,
+    ).values_list('user_id', flat=True))
+
+
+class TimelinePaginator(CursorPaginator):
+    """Лента подписок по тому же ключу (pub_date, id), что и другие ленты.
+
+    Разложенные посты берутся из индекса ленты, посты популярных
+    авторов — из индекса постов каждого автора. Каждая часть читает
+    не больше per_page + 1 строк, части сливаются в памяти.
+    """
+
+    def __init__(self, user, per_page):
+        super().__init__(Post.objects.none(), per_page)
+        self.user = user
+
+    def fetch(self, key, backward):
+        limit = self.per_page + 1
+        entries = after_key(TimelineEntry.objects.filter(user=self.user),
+                            key, backward, pk='post_id')
+        posts = feed_queryset(Post.objects.all())
+        parts = [posts.filter(
+            id__in=entries.values('post_id')[:limit]).order_by()]
+        parts += [
+            after_key(posts.filter(author_id=author_id),
+                      key, backward)[:limit]
+            for author_id in pulled_authors(self.user)
+        ]
+        posts = [post for part in parts for post in part]
+        posts.sort(key=lambda post: (post.pub_date, post.id),
+                   reverse=not backward)
+        return posts[:limit]
+
+
+def timeline_arrange(request):
+    return TimelinePaginator(request.user, POSTS_SHOW).get_page(
+        request.GET.get('cursor'))
+
+
+def refill(follows):
+    """Раскладывает посты по лентам для набора подписок.
+
+    Нужна после массовой загрузки: bulk_create не шлёт сигналов.
+    """
+    for follow in follows.select_related('user', 'author'):
+        backfill(follow.user, follow.author)
@@ -9,6 +9,8 @@ urlpatterns = [
 
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
 
+    path('search/', views.search, name='search'),
+
     path('profile/<str:username>/', views.profile, name='profile'),
 
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
@@ -20,6 +22,9 @@ urlpatterns = [
     path('posts/<int:post_id>/comment/',
          views.add_comment, name='add_comment'),
 
+    path('posts/<int:post_id>/comments/',
+         views.post_comments, name='post_comments'),
+
     path('follow/', views.follow_index, name='follow_index'),
 
     path(
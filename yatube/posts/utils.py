@@ -1,9 +1,176 @@
-from django.core.paginator import Paginator
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 
-from yatube.settings import POSTS_SHOW
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from yatube.settings import COMMENTS_SHOW, POSTS_SHOW
+
+FEED_FIELDS = (
+    'id', 'text', 'pub_date', 'image', 'author', 'group',
+    'author__username', 'author__first_name', 'author__last_name',
+    'group__slug', 'group__title',
+)
+COMMENT_FIELDS = ('id', 'text', 'created', 'post', 'author',
+                  'author__username')
+NEXT = 'next'
+PREVIOUS = 'prev'
+
+
+def parse_date(value):
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(value)
+    return moment
+
+
+def encode_cursor(key, number, direction):
+    """Упаковывает ключ (значение, id) записи в непрозрачный токен."""
+    value, row_id = key
+    raw = f'{value}|{row_id}|{number}|{direction}'
+    return urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(token, parse_value):
+    """Распаковывает токен; для битого токена возвращает None."""
+    try:
+        raw = urlsafe_b64decode(token.encode()).decode()
+        value, row_id, number, direction = raw.split('|')
+        value = parse_value(value)
+        row_id, number = int(row_id), int(number)
+    except (ValueError, UnicodeError):
+        return None
+    if number < 1 or direction not in (NEXT, PREVIOUS):
+        return None
+    return (value, row_id), number, direction
+
+
+class KeysetPaginator(Paginator):
+    """Постраничный вывод по ключу (значение, id) вместо OFFSET.
+
+    Стоимость любой страницы одинакова, COUNT(*) не выполняется:
+    признак следующей страницы определяется по лишней (per_page + 1)
+    записи выборки. Наследники задают выборку и разбор ключа.
+    """
+
+    def __init__(self, object_list, per_page):
+        super().__init__(object_list, per_page)
+        self.num_pages = 1
+
+    def parse_value(self, value):
+        raise NotImplementedError
+
+    def row_key(self, row):
+        raise NotImplementedError
+
+    def fetch(self, key, backward):
+        """Возвращает до per_page + 1 записей за ключом в порядке обхода."""
+        raise NotImplementedError
+
+    def get_page(self, cursor):
+        decoded = decode_cursor(cursor, self.parse_value) if cursor else None
+        key, number, direction = decoded or (None, 1, NEXT)
+        rows = self.fetch(key, backward=direction == PREVIOUS)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == NEXT:
+            return self._build(rows, number, has_more)
+        if not has_more:
+            number = 1
+        return self._build(rows[::-1], number, True)
+
+    def _build(self, rows, number, has_next):
+        self.num_pages = number + 1 if has_next else number
+        page = Page(rows, number, self)
+        page.next_cursor = (
+            encode_cursor(self.row_key(rows[-1]), number + 1, NEXT)
+            if has_next and rows else None
+        )
+        page.previous_cursor = (
+            encode_cursor(self.row_key(rows[0]), number - 1, PREVIOUS)
+            if number > 1 and rows else None
+        )
+        return page
+
+
+def after_key(queryset, key, backward, pk='id'):
+    """Упорядочивает выборку по (pub_date, pk) в порядке обхода и
+    оставляет записи за ключом. pk — поле с id поста."""
+    if backward:
+        queryset = queryset.order_by('pub_date', pk)
+    else:
+        queryset = queryset.order_by('-pub_date', f'-{pk}')
+    if key is None:
+        return queryset
+    pub_date, post_id = key
+    if backward:
+        return queryset.filter(
+            Q(pub_date__gt=pub_date)
+            | Q(pub_date=pub_date, **{f'{pk}__gt': post_id})
+        )
+    return queryset.filter(
+        Q(pub_date__lt=pub_date)
+        | Q(pub_date=pub_date, **{f'{pk}__lt': post_id})
+    )
+
+
+class CursorPaginator(KeysetPaginator):
+    """Лента постов по ключу (pub_date, id)."""
+
+    def parse_value(self, value):
+        return parse_date(value)
+
+    def row_key(self, post):
+        return post.pub_date.isoformat(), post.id
+
+    def fetch(self, key, backward):
+        return list(after_key(self.object_list, key,
+                              backward)[:self.per_page + 1])
+
+
+class CommentPaginator(KeysetPaginator):
+    """Комментарии поста по ключу (created, id), от старых к новым."""
+
+    def parse_value(self, value):
+        return parse_date(value)
+
+    def row_key(self, comment):
+        return comment.created.isoformat(), comment.id
+
+    def fetch(self, key, backward):
+        if backward:
+            queryset = self.object_list.order_by('-created', '-id')
+        else:
+            queryset = self.object_list.order_by('created', 'id')
+        if key is not None:
+            created, comment_id = key
+            if backward:
+                queryset = queryset.filter(
+                    Q(created__lt=created)
+                    | Q(created=created, id__lt=comment_id)
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(created__gt=created)
+                    | Q(created=created, id__gt=comment_id)
+                )
+        return list(queryset[:self.per_page + 1])
+
+
+def feed_queryset(post_list):
+    """Готовит ленту постов: автор и группа одним JOIN, лишние колонки
+    не читаются, чтобы шаблон ленты не делал запросов на каждый пост."""
+    return post_list.select_related('author', 'group').only(*FEED_FIELDS)
 
 
 def paginator_arrange(request, post_list):
-    paginator = Paginator(post_list, POSTS_SHOW)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    paginator = CursorPaginator(post_list, POSTS_SHOW)
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+def comments_arrange(request, comments):
+    """Порция комментариев после курсора: автор одним JOIN."""
+    comments = comments.select_related('author').only(
+        *COMMENT_FIELDS).order_by('created', 'id')
+    return CommentPaginator(comments, COMMENTS_SHOW).get_page(
+        request.GET.get('cursor'))
@@ -1,15 +1,24 @@
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, get_object_or_404, redirect
-from django.views.decorators.cache import cache_page
 
-from .models import Post, Group, User, Comment, Follow
+from yatube.settings import COMMENT_WRITE_BEHIND
+
+from . import writebehind
+from .models import Post, Group, User, Follow
 from .forms import PostForm, CommentForm
-from .utils import paginator_arrange
+from .caching import (AUTHOR, FEED, GROUP, PENDING, POST,
+                      cache_versioned_page, conditional, current_user,
+                      post_author, post_group)
+from .search import search_arrange
+from .snapshots import snapshot
+from .timeline import timeline_arrange
+from .utils import comments_arrange, feed_queryset, paginator_arrange
 
 
-@cache_page(20)
+@conditional((FEED, None))
+@cache_versioned_page((FEED, None))
 def index(request):
-    post_list = Post.objects.all()
+    post_list = feed_queryset(Post.objects.all())
     page_obj = paginator_arrange(request, post_list)
     context = {
         'page_obj': page_obj,
@@ -17,9 +26,21 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = search_arrange(request, query)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@conditional((GROUP, 'slug'))
+@snapshot('group')
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = Post.objects.filter(group=group)
+    post_list = feed_queryset(group.posts.all())
     page_obj = paginator_arrange(request, post_list)
     context = {
         'group': group,
@@ -28,44 +49,54 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
-@cache_page(20)
+@conditional((AUTHOR, 'username'))
+@cache_versioned_page((AUTHOR, 'username'))
+@snapshot('profile')
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    post_list = feed_queryset(author.posts.all())
     page_obj = paginator_arrange(request, post_list)
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(user=request.user,
-                                          author=author).exists()
-    else:
-        following = False
     context = {'author': author,
                'page_obj': page_obj,
-               'following': following,
                }
     return render(request, 'posts/profile.html', context)
 
 
-@cache_page(20)
+@conditional((POST, 'post_id'), (AUTHOR, post_author), (GROUP, post_group),
+             (PENDING, current_user))
+@cache_versioned_page((POST, 'post_id'), (AUTHOR, post_author),
+                      (GROUP, post_group))
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group', 'stats'),
+        id=post_id)
     form = CommentForm(request.POST or None)
-    comments = Comment.objects.filter(post=post).order_by('created')
     context = {'post': post,
                'form': form,
-               'comments': comments
+               'comments': comments_arrange(request, post.comments.all())
                }
     return render(request, 'posts/posts.html', context)
 
 
-@cache_page(20)
+@conditional((POST, 'post_id'))
+@cache_versioned_page((POST, 'post_id'))
+def post_comments(request, post_id):
+    """Следующая порция комментариев для подгрузки на странице поста."""
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    context = {'post': post,
+               'comments': comments_arrange(request, post.comments.all())
+               }
+    return render(request, 'posts/includes/comments.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None,
                     files=request.FILES or None)
     if form.is_valid():
-        post = form.save(commit=False)
-        post.author_id = request.user.id
-        post.save()
+        form.instance.author_id = request.user.id
+        form.save()
         return redirect('posts:profile', request.user.username)
     template = 'posts/create_post.html'
     context = {
@@ -75,7 +106,6 @@ def post_create(request):
     return render(request, template, context)
 
 
-@cache_page(20)
 @login_required
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
@@ -96,24 +126,25 @@ def post_edit(request, post_id):
     return render(request, 'posts/create_post.html', context)
 
 
-@cache_page(20)
 @login_required
 def add_comment(request, post_id):
     form = CommentForm(request.POST or None)
     post = get_object_or_404(Post, pk=post_id)
     if form.is_valid():
-        comment = form.save(commit=False)
-        comment.author = request.user
-        comment.post = post
-        comment.save()
+        if COMMENT_WRITE_BEHIND:
+            writebehind.submit(post.id, request.user.id,
+                               form.cleaned_data['text'])
+        else:
+            comment = form.save(commit=False)
+            comment.author = request.user
+            comment.post = post
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(
-        author__following__user=request.user,)
-    page_obj = paginator_arrange(request, post_list)
+    page_obj = timeline_arrange(request)
     context = {'page_obj': page_obj}
     return render(request, 'posts/follow.html', context)
 
@@ -0,0 +1,200 @@
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.sqlite import local_connection
+from yatube.settings import (COMMENT_FLUSH_BATCH, COMMENT_QUEUE_PATH,
+                             COMMENT_WRITE_BEHIND)
+
+from . import caching, counters
+from .importer import keep_dates
+from .models import Comment, Post, PostStats, User
+from .personal import fragment
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS comments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    post_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    created TEXT NOT NULL,
+    claimed REAL
+);
+CREATE INDEX IF NOT EXISTS comments_post_author
+    ON comments (post_id, author_id);
+'''
+# сколько ждать, пока другой процесс пишет в очередь, с
+BUSY_TIMEOUT = 5
+# через сколько секунд строки упавшего воркера забирает другой
+CLAIM_TIMEOUT = 60
+
+
+def add_claimed(connection):
+    columns = {row[1] for row in connection.execute(
+        'PRAGMA table_info(comments)')}
+    if 'claimed' not in columns:
+        # очередь, созданная до появления отметок
+        connection.execute('ALTER TABLE comments ADD COLUMN claimed REAL')
+
+
+class CommentQueue:
+    """Очередь комментариев в отдельном файле SQLite на этой машине.
+
+    Запись в неё не ждёт единственного писателя основной базы, а
+    synchronous=FULL сохраняет принятый комментарий и при сбое питания.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+
+    @property
+    def connection(self):
+        return local_connection(self.local, self.path, BUSY_TIMEOUT,
+                                'FULL', SCHEMA, prepare=add_claimed)
+
+    def put(self, post_id, author_id, text):
+        self.connection.execute(
+            'INSERT INTO comments (post_id, author_id, text, created) '
+            'VALUES (?, ?, ?, ?)',
+            (post_id, author_id, text, timezone.now().isoformat()))
+
+    def pending(self, post_id, author_id):
+        """Ещё не перенесённые в базу комментарии автора к посту.
+
+        Взятая воркером строка остаётся в очереди и после фиксации
+        в базе, до удаления; такие строки сверяются с Comment, чтобы
+        комментарий не показался дважды.
+        """
+        rows = [(text, parse_datetime(created), claimed)
+                for text, created, claimed in self.connection.execute(
+                    'SELECT text, created, claimed FROM comments '
+                    'WHERE post_id = ? AND author_id = ? ORDER BY id',
+                    (post_id, author_id))]
+        claimed = [created for _, created, mark in rows if mark is not None]
+        saved = set(Comment.objects.filter(
+            post_id=post_id, author_id=author_id, created__in=claimed,
+        ).values_list('created', flat=True)) if claimed else set()
+        return [Comment(post_id=post_id, author_id=author_id, text=text,
+                        created=created)
+                for text, created, _ in rows if created not in saved]
+
+    def __len__(self):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM comments').fetchone()[0]
+
+    @contextmanager
+    def locked(self):
+        """Короткая транзакция записи в очередь."""
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def claim(self, limit):
+        """Отмечает до limit строк как взятые и возвращает их.
+
+        Очередь заперта только на время отметки: запись в основную базу
+        идёт уже без замка, и submit() её не ждёт. Строки воркера,
+        упавшего после отметки, через CLAIM_TIMEOUT берёт другой.
+        """
+        now = time.time()
+        with self.locked() as connection:
+            rows = connection.execute(
+                'SELECT id, post_id, author_id, text, created FROM comments '
+                'WHERE claimed IS NULL OR claimed < ? ORDER BY id LIMIT ?',
+                (now - CLAIM_TIMEOUT, limit)).fetchall()
+            connection.executemany(
+                'UPDATE comments SET claimed = ? WHERE id = ?',
+                [(now, row[0]) for row in rows])
+        return rows
+
+    def flush(self, limit=COMMENT_FLUSH_BATCH):
+        """Переносит до limit комментариев в базу; возвращает их число.
+
+        Два воркера не возьмут одни и те же строки, см. claim. Строки
+        удаляются после фиксации в основной базе: если процесс упадёт
+        между ними, store при повторном переносе пропустит уже
+        сохранённые. При ошибке переноса строки возвращаются в очередь.
+        """
+        rows = self.claim(limit)
+        if not rows:
+            return 0
+        ids = [(row[0],) for row in rows]
+        try:
+            store([row[1:] for row in rows])
+        except BaseException:
+            with self.locked() as connection:
+                connection.executemany(
+                    'UPDATE comments SET claimed = NULL WHERE id = ?', ids)
+            raise
+        with self.locked() as connection:
+            connection.executemany('DELETE FROM comments WHERE id = ?', ids)
+        return len(rows)
+
+
+queue = CommentQueue(COMMENT_QUEUE_PATH)
+
+
+def store(rows):
+    """Сохраняет строки очереди одной транзакцией через bulk_create.
+
+    Комментарии к удалённым постам и от удалённых авторов
+    отбрасываются. Сигналы при bulk_create не срабатывают, поэтому
+    счётчики и версии кеша сдвигаются здесь.
+    """
+    comments = [Comment(post_id=post_id, author_id=author_id, text=text,
+                        created=parse_datetime(created))
+                for post_id, author_id, text, created in rows]
+    post_ids = set(Post.objects.filter(
+        id__in={comment.post_id for comment in comments}
+    ).values_list('id', flat=True))
+    author_ids = set(User.objects.filter(
+        id__in={comment.author_id for comment in comments}
+    ).values_list('id', flat=True))
+    saved = set(Comment.objects.filter(
+        post_id__in=post_ids,
+        created__range=(min(comment.created for comment in comments),
+                        max(comment.created for comment in comments)),
+    ).values_list('post_id', 'author_id', 'created'))
+    comments = [
+        comment for comment in comments
+        if comment.post_id in post_ids and comment.author_id in author_ids
+        and (comment.post_id, comment.author_id, comment.created) not in saved
+    ]
+    per_post = Counter(comment.post_id for comment in comments)
+    with transaction.atomic(), keep_dates(Comment, 'created'):
+        Comment.objects.bulk_create(comments)
+        for post_id, count in per_post.items():
+            counters.change(PostStats, post_id, 'comments_count', count)
+    for post_id in per_post:
+        caching.bump(caching.POST, post_id)
+    for author_id in {comment.author_id for comment in comments}:
+        caching.bump(caching.PENDING, author_id)
+
+
+def submit(post_id, author_id, text):
+    """Ставит комментарий в очередь; автор видит его сразу."""
+    queue.put(post_id, author_id, text)
+    caching.bump(caching.PENDING, author_id)
+
+
+@fragment('pending_comments')
+def pending_comments(request, post_id):
+    if not COMMENT_WRITE_BEHIND or not request.user.is_authenticated:
+        return ''
+    comments = queue.pending(post_id, request.user.pk)
+    if not comments:
+        return ''
+    return render_to_string('posts/includes/pending_comments.html',
+                            {'comments': comments}, request=request)
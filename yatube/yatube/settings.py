@@ -21,7 +21,58 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 # указываем директорию, в которую будут складываться файлы писем
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 POSTS_SHOW = 10
+# комментариев на странице поста и в каждой подгрузке
+COMMENTS_SHOW = 20
+# отложенная запись: add_comment кладёт комментарий в локальную очередь,
+# команда flush_comments переносит очередь в базу пачками
+COMMENT_WRITE_BEHIND = False
+COMMENT_QUEUE_PATH = os.path.join(BASE_DIR, 'comment_queue.sqlite3')
+COMMENT_FLUSH_BATCH = 500
+COMMENT_FLUSH_INTERVAL = 1
+# статические копии первых SNAPSHOT_PAGES страниц каждой группы и
+# SNAPSHOT_PROFILES самых популярных профилей; собирает их команда
+# build_snapshots, после изменений копии пересобираются после ответа;
+# нужен общий кеш версий, CACHE_BACKEND 'shared' или 'tiered'
+SNAPSHOTS = False
+SNAPSHOT_ROOT = os.path.join(BASE_DIR, 'snapshots')
+SNAPSHOT_PAGES = 3
+SNAPSHOT_PROFILES = 100
 FIRST_POST_SYMBOLS = 15
+# версии в ключах сбрасываются сигналами, поэтому кеш можно держать долго
+CACHE_TTL = 60 * 60 * 6
+# пересборку кеша начинает один запрос, остальные отдают старую копию;
+# чем больше BETA, тем раньше записи обновляются до истечения срока
+CACHE_LOCK_TIMEOUT = 10
+CACHE_LOCK_WAIT = 2
+CACHE_EARLY_EXPIRATION_BETA = 1.0
+# авторов с большим числом подписчиков лента подтягивает при чтении;
+# обратно к раскладке автор возвращается, только когда подписчиков не
+# больше FANOUT_RESUME_FOLLOWERS: колебания у порога не раскладывают
+# посты снова и снова. Возобновлённая раскладка идёт после ответа
+# пачками по FANOUT_BATCH_SIZE подписчиков
+FANOUT_MAX_FOLLOWERS = 1000
+FANOUT_RESUME_FOLLOWERS = 900
+FANOUT_BATCH_SIZE = 50
+TIMELINE_BACKFILL_LIMIT = 1000
+# сколько свежих постов хранит лента подписчика; лишние удаляются после
+# каждого TIMELINE_TRIM_EVERY-го поста автора
+TIMELINE_MAX_ENTRIES = 1000
+TIMELINE_TRIM_EVERY = 100
+# размеры миниатюр из шаблонов: их готовят заранее, вне запроса
+THUMBNAIL_PRESETS = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+# потоки процесса для работы после ответа: миниатюры, копии страниц,
+# см. core.deferred
+AFTER_RESPONSE_WORKERS = 2
+# для баз без FTS5: 'posts.search.ContainsBackend'
+SEARCH_BACKEND = 'posts.search.SQLiteFTSBackend'
+# сколько строк выгрузка читает из базы за один раз
+EXPORT_CHUNK_SIZE = 2000
+# сколько строк загрузка проверяет и вставляет за раз
+IMPORT_BATCH_SIZE = 1000
+# потоки ASGI-входа для работы с базой и шаблонами, см. core.asgi
+ASGI_THREADS = 8
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
@@ -44,10 +95,43 @@ ALLOWED_HOSTS = [
     'testserver',
 ]
 
-CACHES = {
-    'default': {
+# 'shared' — один кеш на все процессы машины в файле SQLite, нужен при
+# нескольких воркерах; 'locmem' — свой кеш у каждого процесса;
+# 'tiered' — 'shared' с копиями горячих ключей в памяти процесса
+CACHE_BACKEND = 'locmem'
+CACHE_BACKENDS = {
+    'locmem': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    'shared': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+            'MAX_BYTES': 256 * 1024 * 1024,
+        },
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+        },
+    },
+    'tiered': {
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': 'tiered',
+        'OPTIONS': {
+            'L2': 'shared',
+            'L1_TIMEOUT': 5,
+            'L1_MAX_BYTES': 32 * 1024 * 1024,
+        },
+    },
+}
+CACHES = {
+    'default': CACHE_BACKENDS[CACHE_BACKEND],
+    # второй уровень для 'tiered'
+    'shared': CACHE_BACKENDS['shared'],
 }
 # Application definition
 
@@ -62,15 +146,19 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ServerTimingMiddleware',
+    'core.middleware.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.RateLimitMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -79,7 +167,7 @@ ROOT_URLCONF = 'yatube.urls'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.TimedDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -89,23 +177,65 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'core.context_processors.cache.cache_version',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
+ASGI_APPLICATION = 'yatube.asgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
+# 'production' — постоянные соединения и журнал WAL: запись комментария
+# не останавливает чтение лент; PRAGMAS применяет core.db.apply_pragmas
+DATABASE_PROFILE = 'default'
+DATABASE_PROFILES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    },
+    'production': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'PRAGMAS': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'mmap_size': 256 * 1024 * 1024,
+            'busy_timeout': 5000,
+        },
+    },
+}
+# лимиты записи по имени URL: capacity запросов подряд, затем capacity
+# за period секунд; у пользователя своё ведро, у гостя — у каждого IP
+RATE_LIMITS = {
+    'posts:add_comment': {'capacity': 10, 'period': 60,
+                          'methods': ('POST',)},
+    'posts:post_create': {'capacity': 5, 'period': 300,
+                          'methods': ('POST',)},
+    'posts:profile_follow': {'capacity': 30, 'period': 60,
+                             'methods': ('GET', 'POST')},
+}
+# реплики только для чтения: имя подключения -> файл с копией основной
+# базы, копирование идёт снаружи; после записи клиент и страницы с
+# только что изменёнными данными читают основную базу REPLICA_PIN_SECONDS.
+# Срок должен быть больше периода копирования плюс время самой копии:
+# реплика, файл которой старше срока, не читается вовсе
+DATABASE_REPLICAS = {}
+REPLICA_PIN_SECONDS = 5
+DATABASES = {
+    'default': DATABASE_PROFILES[DATABASE_PROFILE],
+    **{
+        alias: {**DATABASE_PROFILES[DATABASE_PROFILE], 'NAME': name,
+                'TEST': {'MIRROR': 'default'}}
+        for alias, name in DATABASE_REPLICAS.items()
+    },
 }
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
 
 
 # Password validation